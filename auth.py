@@ -3,12 +3,15 @@ Authentication Utilities
 JWT token generation and password hashing
 """
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+from cachetools import TTLCache
 import os
 from dotenv import load_dotenv
 
@@ -22,18 +25,73 @@ SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing: Argon2id for new hashes; bcrypt kept only to verify
+# legacy hashes, which are upgraded to Argon2id on the next login
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__memory_cost=12288,  # 12 MiB
+    argon2__time_cost=3,
+    argon2__parallelism=1
+)
 
 # Bearer token scheme
 security = HTTPBearer()
 
+# Authenticated user rows (id -> column snapshot), so most requests skip the
+# users SELECT. Entries are evicted when a User is written through the ORM;
+# other worker processes may see a stale row for up to the TTL.
+_user_cache = TTLCache(maxsize=4096, ttl=30)
+_USER_COLUMNS = tuple(column.key for column in User.__table__.columns)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _evict_cached_user(mapper, connection, target):
+    _user_cache.pop(target.id, None)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("evicted_user_ids", set()).add(target.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_users(session):
+    # Evict again after commit in case a concurrent request re-cached the old row
+    for user_id in session.info.pop("evicted_user_ids", ()):
+        _user_cache.pop(user_id, None)
+
+
+def evict_cached_user(user_id: int) -> None:
+    """Drop a cached user after a Core UPDATE, which bypasses the mapper events"""
+    _user_cache.pop(user_id, None)
+
+
+async def _load_user(db: AsyncSession, user_id: int) -> Optional[User]:
+    """Load a user by id, attaching a cached snapshot to the session when available"""
+    snapshot = _user_cache.get(user_id)
+    if snapshot is None:
+        user = await db.get(User, user_id)
+        if user is not None:
+            _user_cache[user_id] = {key: getattr(user, key) for key in _USER_COLUMNS}
+        return user
+    
+    # Rebuild as a persistent instance without a SELECT
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    db.add(user)
+    return user
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if the stored one is outdated"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
@@ -62,7 +120,7 @@ def decode_token(token: str) -> Optional[dict]:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> User:
     """Get current authenticated user from JWT token"""
     credentials_exception = HTTPException(
@@ -86,7 +144,7 @@ async def get_current_user(
     except ValueError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await _load_user(db, user_id)
     if user is None:
         raise credentials_exception
     
@@ -95,7 +153,7 @@ async def get_current_user(
 
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     """Get current user if authenticated, None otherwise"""
     if credentials is None:
@@ -107,8 +165,11 @@ async def get_current_user_optional(
     if payload is None:
         return None
     
-    user_id: int = payload.get("sub")
+    user_id = payload.get("sub")
     if user_id is None:
         return None
     
-    return db.query(User).filter(User.id == user_id).first()
+    try:
+        return await _load_user(db, int(user_id))
+    except ValueError:
+        return None
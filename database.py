@@ -1,15 +1,31 @@
 """
 Database Configuration
-SQLAlchemy setup with PostgreSQL
+Async SQLAlchemy setup with PostgreSQL (asyncpg) or SQLite (aiosqlite)
 """
-from sqlalchemy import create_engine
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 import os
+import json
+import asyncio
+import logging
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Try to import Prometheus client for pool metrics
+try:
+    from prometheus_client import Gauge
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./ai_counsellor.db")
 
 # Fix Render/Heroku postgres URL compatibility
@@ -33,28 +49,185 @@ try:
 except Exception:
     pass
 
-# Debug print to verify URL transformation (masked for security)
-try:
-    safe_url = DATABASE_URL.split("@")[-1] if "@" in DATABASE_URL else "..."
-    # print(f"DEBUG: Database config using Host: {safe_url}")
-except:
-    pass
+
+# Use async drivers: asyncpg for PostgreSQL, aiosqlite for SQLite
+if DATABASE_URL.startswith("postgresql://"):
+    DATABASE_URL = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+elif DATABASE_URL.startswith("sqlite://"):
+    DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+database_url = make_url(DATABASE_URL)
+connect_args = {}
+
+# asyncpg does not understand libpq-only query params; translate them
+if database_url.drivername == "postgresql+asyncpg":
+    query = dict(database_url.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+    if "options" in query:
+        connect_args["server_settings"] = {"options": query.pop("options")}
+    database_url = database_url.set(query=query)
 
 
 # Use SQLite for development if PostgreSQL not available
 if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    engine = create_async_engine(database_url, query_cache_size=1200)
 else:
-    engine = create_engine(DATABASE_URL)
+    engine = create_async_engine(
+        database_url,
+        connect_args=connect_args,
+        pool_size=20,
+        max_overflow=80,
+        pool_timeout=5,  # fail fast (503) instead of queueing for 30s
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        pool_use_lifo=True,  # reuse warm connections; idle extras age out via pool_recycle
+        query_cache_size=1200
+    )
+
+POOL_METRICS_INTERVAL_SECONDS = 5
+
+if PROMETHEUS_AVAILABLE:
+    POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool")
+    POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections open beyond pool_size")
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async def report_pool_metrics():
+    """Publish pool usage to Prometheus every few seconds"""
+    pool = engine.pool
+    while True:
+        if hasattr(pool, "checkedout"):
+            POOL_CHECKED_OUT.set(pool.checkedout())
+            POOL_OVERFLOW.set(max(pool.overflow(), 0))
+        await asyncio.sleep(POOL_METRICS_INTERVAL_SECONDS)
+
+# expire_on_commit=False: attributes stay loaded after commit, since lazy
+# refreshes are not possible on an AsyncSession
+AsyncSessionLocal = async_sessionmaker(
+    bind=engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# One session per asyncio task (i.e. per request); ScopedSessionMiddleware
+# removes it once the response is finished
+ScopedSession = async_scoped_session(AsyncSessionLocal, scopefunc=asyncio.current_task)
 
 Base = declarative_base()
 
-def get_db():
+# There are no migrations yet, so create_all is how tables get made; set
+# RUN_MIGRATIONS_ON_BOOT=0 on Postgres once the schema is managed elsewhere
+CREATE_TABLES_ON_STARTUP = engine.dialect.name == "sqlite" or os.getenv("RUN_MIGRATIONS_ON_BOOT", "1") == "1"
+STARTUP_CONNECT_ATTEMPTS = 5
+
+def upgrade_schema(conn):
+    """Bring tables made by an older create_all up to date; safe to run on every boot"""
+    # create_all skips tables that already exist, so newer columns and indexes never land
+    inspector = inspect(conn)
+    task_columns = {column["name"] for column in inspector.get_columns("tasks")}
+    if "priority_rank" not in task_columns:
+        conn.execute(text("ALTER TABLE tasks ADD COLUMN priority_rank SMALLINT NOT NULL DEFAULT 2"))
+        # Same mapping as models.Priority.from_label: unknown labels rank as medium
+        conn.execute(text(
+            "UPDATE tasks SET priority_rank = CASE lower(priority) "
+            "WHEN 'high' THEN 3 WHEN 'low' THEN 1 ELSE 2 END"
+        ))
+    
+    conversation_columns = {column["name"] for column in inspector.get_columns("conversations")}
+    if "summary_through_id" not in conversation_columns:
+        # Left NULL on older summaries, which are read as covering everything below their own id
+        conn.execute(text("ALTER TABLE conversations ADD COLUMN summary_through_id INTEGER"))
+    
+    # StringList columns made as TEXT by older builds become JSONB on PostgreSQL
+    if conn.dialect.name == "postgresql":
+        from models import parse_string_list  # models imports this module
+        for table, column in (("profiles", "preferred_countries"), ("universities", "programs")):
+            column_types = {c["name"]: c["type"] for c in inspector.get_columns(table)}
+            if isinstance(column_types.get(column), JSONB):
+                continue
+            # Wrap every old value as a JSON string so no row can fail the cast, then
+            # reparse those strings with the same legacy-tolerant parser the reads use
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING to_jsonb({column})"))
+            rows = conn.execute(text(
+                f"SELECT id, {column} #>> '{{}}' FROM {table} WHERE jsonb_typeof({column}) = 'string'"
+            )).all()
+            if rows:
+                updates = []
+                for row_id, raw in rows:
+                    items = parse_string_list(raw)
+                    updates.append({"id": row_id, "value": json.dumps(items) if items is not None else None})
+                conn.execute(text(f"UPDATE {table} SET {column} = CAST(:value AS JSONB) WHERE id = :id"), updates)
+    
+    # The unique shortlist index can't be built over duplicate rows from before it existed;
+    # keep the locked (else the oldest) row of each (user, university) pair
+    shortlist_indexes = {index["name"] for index in inspector.get_indexes("shortlisted_universities")}
+    if "ix_shortlist_user_uni" not in shortlist_indexes:
+        removed = conn.execute(text(
+            "DELETE FROM shortlisted_universities WHERE id IN ("
+            "SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+            "PARTITION BY user_id, university_id "
+            "ORDER BY CASE WHEN is_locked THEN 0 ELSE 1 END, id) AS rn "
+            "FROM shortlisted_universities) ranked WHERE rn > 1)"
+        )).rowcount
+        if removed:
+            logger.warning("Removed %s duplicate shortlist rows before creating ix_shortlist_user_uni", removed)
+    
+    # Includes ix_tasks_user_priority_created and the other composite indexes
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+async def create_tables():
+    """create_all plus upgrade_schema, retried while a cold database (e.g. Supabase) wakes up"""
+    for attempt in range(1, STARTUP_CONNECT_ATTEMPTS + 1):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(upgrade_schema)
+            return
+        except (OperationalError, OSError) as e:
+            if attempt == STARTUP_CONNECT_ATTEMPTS:
+                raise
+            delay = 2 ** (attempt - 1)
+            logger.warning("Database not ready (%s); retrying create_all in %ss", e, delay)
+            await asyncio.sleep(delay)
+
+def dialect_insert(model):
+    """INSERT construct for the active backend (supports ON CONFLICT clauses)"""
+    if engine.dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+STREAM_BATCH_SIZE = 200
+
+async def stream_json_array(db: AsyncSession, stmt, schema):
+    """Yield a column SELECT as a JSON array, one schema-encoded row at a time"""
+    result = await db.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+    yield b"["
+    first = True
+    async for row in result:
+        if not first:
+            yield b","
+        first = False
+        # Rows come straight from the database, so skip re-validating every field
+        yield schema.model_construct(**row._mapping).model_dump_json().encode()
+    yield b"]"
+
+async def get_db() -> AsyncSession:
     """Dependency for database sessions"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    return ScopedSession()
+
+
+class ScopedSessionMiddleware:
+    """Close the request's scoped session after the response is sent"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        # Plain ASGI (not BaseHTTPMiddleware) so the app runs in this same task
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if scope["type"] in ("http", "websocket"):
+                await ScopedSession.remove()
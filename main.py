@@ -2,20 +2,68 @@
 AI Counsellor Backend - Main Application
 FastAPI application with CORS, routers, and startup events
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from contextlib import asynccontextmanager
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from contextlib import asynccontextmanager, suppress
+from logging.handlers import QueueHandler, QueueListener
+import asyncio
+import logging
+import os
+import queue
 
-from database import engine, Base
+from database import engine, create_tables, CREATE_TABLES_ON_STARTUP, ScopedSessionMiddleware, PROMETHEUS_AVAILABLE, report_pool_metrics
+from services.gemini_service import GeminiService
 from routers import auth, profile, universities, counsellor, tasks, documents
 
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+
+def start_logging() -> QueueListener:
+    """Route log records through a queue; a listener thread does the blocking writes"""
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+    # httpx would log every Gemini round trip at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: QueueListener) -> None:
+    """Flush queued records and detach the queue handler"""
+    listener.stop()
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, QueueHandler) and h.queue is listener.queue]:
+        root.removeHandler(handler)
+
+
 # Create database tables on startup
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    log_listener = start_logging()
     # Startup: Create tables
-    Base.metadata.create_all(bind=engine)
+    if CREATE_TABLES_ON_STARTUP:
+        await create_tables()
+    # One Gemini client (and its connection pool) for every request
+    app.state.gemini = GeminiService()
+    metrics_task = asyncio.create_task(report_pool_metrics()) if PROMETHEUS_AVAILABLE else None
     yield
-    # Shutdown: cleanup if needed
+    # Shutdown: stop metrics and release pooled connections
+    if metrics_task:
+        metrics_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await metrics_task
+    await app.state.gemini.aclose()
+    await engine.dispose()
+    stop_logging(log_listener)
 
 app = FastAPI(
     title="AI Counsellor API",
@@ -24,19 +72,39 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# CORS Configuration
+# CORS Configuration (comma-separated CORS_ORIGINS overrides the defaults)
+DEFAULT_CORS_ORIGINS = "http://localhost:3000,http://127.0.0.1:3000,https://ai-counsellor-silk.vercel.app"
+CORS_ORIGINS = tuple(
+    origin.strip()
+    for origin in (os.getenv("CORS_ORIGINS") or DEFAULT_CORS_ORIGINS).split(",")
+    if origin.strip()
+)
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000", 
-        "http://127.0.0.1:3000",
-        "https://ai-counsellor-silk.vercel.app"
-    ],
+    allow_origins=list(CORS_ORIGINS),
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Pool exhausted for pool_timeout seconds: shed load instead of piling up
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Database is busy, please retry"},
+        headers={"Retry-After": "1"}
+    )
+
+# Expose pool gauges for scraping
+if PROMETHEUS_AVAILABLE:
+    from prometheus_client import make_asgi_app
+    app.mount("/metrics", make_asgi_app())
+
+# Release each request's database session
+app.add_middleware(ScopedSessionMiddleware)
+
 # Include Routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(profile.router, prefix="/api/profile", tags=["Profile"])
@@ -2,12 +2,63 @@
 SQLAlchemy Models
 Database models for AI Counsellor
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, ARRAY, Float, Text, Date
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, SmallInteger, String, Boolean, DateTime, ForeignKey, ARRAY, Float, Text, Date, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
+from enum import IntEnum
+import json
 from database import Base
 
 
+def parse_string_list(value: str):
+    """Parse a JSON array string, or a legacy comma-separated one, into a list"""
+    value = value.strip()
+    if not value:
+        return None
+    if value.startswith("["):
+        try:
+            return json.loads(value)
+        except ValueError:
+            # A malformed row must not break every read of it; treat it as comma-separated
+            value = value.strip("[]").replace('"', "")
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+class StringList(TypeDecorator):
+    """List of strings: native JSONB on PostgreSQL, JSON text elsewhere"""
+    impl = Text
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB())
+        return dialect.type_descriptor(Text())
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or dialect.name == "postgresql":
+            return value
+        return json.dumps(value)
+    
+    def process_result_value(self, value, dialect):
+        # Rows written before the column held lists may still be plain text
+        if isinstance(value, str):
+            return parse_string_list(value)
+        return value
+
+
+class Priority(IntEnum):
+    """Sortable code for Task.priority (string order would put "high" < "medium")"""
+    LOW = 1
+    MEDIUM = 2
+    HIGH = 3
+
+    @classmethod
+    def from_label(cls, label) -> "Priority":
+        return cls.__members__.get((label or "").upper(), cls.MEDIUM)
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -45,7 +96,7 @@ class Profile(Base):
     intended_degree = Column(String(100))  # bachelors, masters, mba, phd
     field_of_study = Column(String(255))
     target_intake = Column(String(50))  # fall_2025, spring_2026, etc.
-    preferred_countries = Column(Text)  # JSON string array
+    preferred_countries = Column(StringList())  # ["USA", "Canada"]
     
     # Budget
     budget_min = Column(Integer)
@@ -68,6 +119,13 @@ class Profile(Base):
     
     # Relationships
     user = relationship("User", back_populates="profile")
+    
+    @validates("preferred_countries")
+    def _parse_preferred_countries(self, key, value):
+        """Accept the legacy string form (e.g. from AI extraction) and store a list"""
+        if isinstance(value, str):
+            value = parse_string_list(value)
+        return value
 
 
 class University(Base):
@@ -75,12 +133,12 @@ class University(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
-    country = Column(String(100))
+    country = Column(String(100), index=True)
     city = Column(String(100))
     ranking = Column(Integer)
     tuition_min = Column(Integer)
     tuition_max = Column(Integer)
-    programs = Column(Text)  # JSON string array
+    programs = Column(StringList())  # ["Computer Science", "Business"]
     acceptance_rate = Column(Float)
     ielts_requirement = Column(Float)
     gre_requirement = Column(Integer)
@@ -95,6 +153,11 @@ class University(Base):
 
 class ShortlistedUniversity(Base):
     __tablename__ = "shortlisted_universities"
+    __table_args__ = (
+        # One row per (user, university); also serves the per-user lookups
+        Index("ix_shortlist_user_uni", "user_id", "university_id", unique=True),
+        Index("ix_shortlist_user_locked", "user_id", "is_locked"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -131,6 +194,12 @@ class Document(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_id_id", "user_id", "id"),
+        Index("ix_tasks_user_priority_created", "user_id", "priority_rank", "created_at"),
+        # Pending-task context and the dashboard counts read only these two columns
+        Index("ix_tasks_user_completed", "user_id", "is_completed"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -139,6 +208,7 @@ class Task(Base):
     description = Column(Text)
     category = Column(String(50))  # document, exam, application, general
     priority = Column(String(20), default="medium")  # low, medium, high
+    priority_rank = Column(SmallInteger, nullable=False, default=int(Priority.MEDIUM), server_default="2")  # derived from priority
     due_date = Column(Date)
     is_completed = Column(Boolean, default=False)
     completed_at = Column(DateTime(timezone=True))
@@ -146,15 +216,27 @@ class Task(Base):
     
     # Relationships
     user = relationship("User", back_populates="tasks")
+    
+    @validates("priority")
+    def _sync_priority_rank(self, key, value):
+        """Keep priority_rank in step with priority on every write"""
+        self.priority_rank = int(Priority.from_label(value))
+        return value
 
 
 class Conversation(Base):
     __tablename__ = "conversations"
+    __table_args__ = (
+        # History pages, rolling-summary lookup and clear-history are all per-user by id
+        Index("ix_conversations_user_id_id", "user_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     message = Column(Text, nullable=False)
-    role = Column(String(20), nullable=False)  # user, assistant
+    role = Column(String(20), nullable=False)  # user, assistant, summary
+    # Summary rows only: id of the newest message folded into the summary
+    summary_through_id = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
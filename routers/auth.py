@@ -3,15 +3,17 @@ Authentication Router
 Signup, Login, and User management endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
+import asyncio
 
-from database import get_db
+from database import get_db, dialect_insert
 from models import User, Profile
 from schemas import UserCreate, UserLogin, Token, UserResponse
 from auth import (
     get_password_hash, 
-    verify_password, 
+    verify_and_update_password, 
     create_access_token, 
     get_current_user,
     ACCESS_TOKEN_EXPIRE_MINUTES
@@ -21,31 +23,32 @@ router = APIRouter()
 
 
 @router.post("/signup", response_model=Token)
-async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """Register a new user"""
-    # Check if email already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
-    if existing_user:
+    # Hashing is CPU-bound, keep it off the event loop
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
+    
+    # Insert user; the unique email index rejects duplicates atomically
+    stmt = (
+        dialect_insert(User)
+        .values(
+            email=user_data.email,
+            password_hash=hashed_password,
+            full_name=user_data.full_name
+        )
+        .on_conflict_do_nothing(index_elements=["email"])
+        .returning(User)
+    )
+    new_user = (await db.execute(stmt)).scalar_one_or_none()
+    if new_user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    new_user = User(
-        email=user_data.email,
-        password_hash=hashed_password,
-        full_name=user_data.full_name
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    
-    # Create empty profile
-    profile = Profile(user_id=new_user.id)
-    db.add(profile)
-    db.commit()
+    # Create empty profile in the same transaction; the relationship fills user_id
+    db.add(Profile(user=new_user))
+    await db.commit()
     
     # Generate token
     access_token = create_access_token(
@@ -61,16 +64,31 @@ async def signup(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=Token)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
     """Login and get access token"""
-    user = db.query(User).filter(User.email == credentials.email).first()
+    result = await db.execute(select(User).where(User.email == credentials.email))
+    user = result.scalar_one_or_none()
+    
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
+        )
     
-    if not user or not verify_password(credentials.password, user.password_hash):
+    is_valid, new_hash = await asyncio.to_thread(
+        verify_and_update_password, credentials.password, user.password_hash
+    )
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
     
+    # Upgrade legacy/outdated hashes transparently on login
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+    
     access_token = create_access_token(
         data={"sub": str(user.id)},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -93,11 +111,11 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
 async def update_user(
     full_name: str = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update user information"""
     if full_name:
         current_user.full_name = full_name
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
     return current_user
@@ -2,36 +2,116 @@
 AI Counsellor Router
 Chat and voice-based AI counselling with Gemini integration
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Optional
-import json
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, delete, bindparam, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, NamedTuple, Optional
+from collections import deque
+from itertools import count
+from cachetools import TTLCache
+import asyncio
+import logging
+import orjson
 import os
-from datetime import datetime
 
-from database import get_db
-from models import User, Profile, University, ShortlistedUniversity, Task, Conversation
-from schemas import ChatMessage, ChatResponse, VoiceOnboardingMessage, VoiceOnboardingResponse
+from database import get_db, dialect_insert, AsyncSessionLocal
+from models import User, Profile, ShortlistedUniversity, Task, Conversation
+from schemas import ChatMessage, ChatResponse, ConversationMessage, VoiceOnboardingMessage, VoiceOnboardingResponse
 from auth import get_current_user
-from services.gemini_service import GeminiService
+from routers.profile import clean_profile_values, upsert_profile
+from services.university_catalog import university_catalog
+from services.gemini_service import GeminiService, HISTORY_RAW_TURNS, get_gemini
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
+SUMMARY_ROLE = "summary"
+HISTORY_FETCH_LIMIT = 20
 
-def get_user_context(db: Session, user: User) -> dict:
-    """Get complete user context for AI"""
-    profile = db.query(Profile).filter(Profile.user_id == user.id).first()
-    
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == user.id
-    ).all()
-    
-    locked = [s for s in shortlisted if s.is_locked]
+
+class HistoryEntry(NamedTuple):
+    id: int
+    role: str
+    message: str
+
+
+# Last HISTORY_FETCH_LIMIT non-summary messages per user ({user_id: deque of
+# HistoryEntry}, oldest first), so follow-up chats skip the history SELECT.
+# Extended after each saved exchange and dropped when history is cleared;
+# other worker processes may miss newer messages for up to the TTL.
+_recent_history = TTLCache(maxsize=4096, ttl=300)
+
+# Stamp of each user's last history write ({user_id: int}), so a cold-cache read
+# that raced a save or a clear is not installed over the newer state
+_history_writes = TTLCache(maxsize=4096, ttl=300)
+_write_stamps = count(1)
+
+# The profile fields the AI sees, read as plain columns instead of a full Profile entity
+CONTEXT_PROFILE_COLUMNS = (
+    Profile.education_level,
+    Profile.degree,
+    Profile.major,
+    Profile.graduation_year,
+    Profile.gpa,
+    Profile.intended_degree,
+    Profile.field_of_study,
+    Profile.target_intake,
+    Profile.preferred_countries,
+    Profile.budget_min,
+    Profile.budget_max,
+    Profile.funding_type,
+    Profile.ielts_status,
+    Profile.ielts_score,
+    Profile.gre_status,
+    Profile.gre_score,
+    Profile.sop_status
+)
+CONTEXT_PROFILE_KEYS = tuple(column.key for column in CONTEXT_PROFILE_COLUMNS)
+
+
+# Context queries built once, so each request reuses the compiled statements
+_CONTEXT_PROFILE = select(*CONTEXT_PROFILE_COLUMNS).where(Profile.user_id == bindparam("uid"))
+
+_CONTEXT_SHORTLIST = select(
+    ShortlistedUniversity.university_id,
+    ShortlistedUniversity.category,
+    ShortlistedUniversity.is_locked
+).where(ShortlistedUniversity.user_id == bindparam("uid"))
+
+_CONTEXT_TASKS = select(Task.title, Task.category, Task.priority).where(
+    Task.user_id == bindparam("uid"),
+    Task.is_completed == False
+)
+
+# Latest rolling summary; it covers every message up to through_id (older rows
+# without one covered everything below their own id)
+_CONTEXT_SUMMARY = select(
+    Conversation.message,
+    func.coalesce(Conversation.summary_through_id, Conversation.id).label("through_id")
+).where(
+    Conversation.user_id == bindparam("uid"),
+    Conversation.role == SUMMARY_ROLE
+).order_by(Conversation.id.desc()).limit(1)
+
+_CONTEXT_HISTORY = select(Conversation.id, Conversation.role, Conversation.message).where(
+    Conversation.user_id == bindparam("uid"),
+    Conversation.role != SUMMARY_ROLE
+).order_by(Conversation.id.desc()).limit(HISTORY_FETCH_LIMIT)
+
+
+async def _context_profile(db: AsyncSession, user_id: int):
+    return (await db.execute(_CONTEXT_PROFILE, {"uid": user_id})).first()
+
+
+async def _context_shortlist(db: AsyncSession, user_id: int) -> list:
+    # Shortlist columns from the database; names and countries from the
+    # in-process catalog instead of one University query per row
+    shortlisted = (await db.execute(_CONTEXT_SHORTLIST, {"uid": user_id})).all()
     
-    # Get university names for shortlisted and locked
     shortlist_info = []
     for s in shortlisted:
-        uni = db.query(University).filter(University.id == s.university_id).first()
+        uni = await university_catalog.get(db, s.university_id)
         if uni:
             shortlist_info.append({
                 "name": uni.name,
@@ -39,21 +119,70 @@ def get_user_context(db: Session, user: User) -> dict:
                 "category": s.category,
                 "is_locked": s.is_locked
             })
-    
-    # Get pending tasks
-    tasks = db.query(Task).filter(
-        Task.user_id == user.id,
-        Task.is_completed == False
-    ).all()
-    
-    task_info = [{"title": t.title, "category": t.category, "priority": t.priority} for t in tasks]
-    
-    # Get recent conversation history
-    history = db.query(Conversation).filter(
-        Conversation.user_id == user.id
-    ).order_by(Conversation.created_at.desc()).limit(10).all()
-    
-    history_messages = [{"role": c.role, "content": c.message} for c in reversed(history)]
+    return shortlist_info
+
+
+async def _context_tasks(db: AsyncSession, user_id: int) -> list:
+    result = await db.execute(_CONTEXT_TASKS, {"uid": user_id})
+    return [{"title": t.title, "category": t.category, "priority": t.priority} for t in result.all()]
+
+
+async def _context_summary(db: AsyncSession, user_id: int):
+    return (await db.execute(_CONTEXT_SUMMARY, {"uid": user_id})).first()
+
+
+async def _context_history(db: AsyncSession, user_id: int) -> list:
+    cached = _recent_history.get(user_id)
+    if cached is not None:
+        return list(cached)
+    
+    stamp = _history_writes.get(user_id)
+    result = await db.execute(_CONTEXT_HISTORY, {"uid": user_id})
+    history = [HistoryEntry(*row) for row in reversed(result.all())]
+    if _history_writes.get(user_id) == stamp:
+        _recent_history[user_id] = deque(history, maxlen=HISTORY_FETCH_LIMIT)
+    return history
+
+
+def _touch_history(user_id: int) -> None:
+    """Mark the user's history as written, invalidating cold-cache reads still in flight"""
+    _history_writes[user_id] = next(_write_stamps)
+
+
+def _remember_messages(user_id: int, *entries: HistoryEntry) -> None:
+    """Append freshly committed messages to a user's cached history, if they have one"""
+    _touch_history(user_id)
+    cached = _recent_history.get(user_id)
+    if cached is not None:
+        for entry in entries:
+            # The read that filled the cache may already include the user's message
+            if not cached or entry.id > cached[-1].id:
+                cached.append(entry)
+
+
+async def get_user_context(db: AsyncSession, user: User) -> dict:
+    """Get complete user context for AI"""
+    # Column selects throughout: every value lands in a plain dict, so skip ORM hydration.
+    # Small indexed reads, run back to back on the request's connection: fanning them
+    # out over extra pooled sessions would cost more pool capacity than it saves
+    profile = await _context_profile(db, user.id)
+    shortlist_info = await _context_shortlist(db, user.id)
+    task_info = await _context_tasks(db, user.id)
+    summary = await _context_summary(db, user.id)
+    history = await _context_history(db, user.id)
+    
+    # Keep the last few turns verbatim even if the summary already covers them
+    raw_from = len(history) - HISTORY_RAW_TURNS
+    history_messages = [
+        {"role": c.role, "content": c.message}
+        for i, c in enumerate(history)
+        if summary is None or c.id > summary.through_id or i >= raw_from
+    ]
+    unsummarized = [
+        {"role": c.role, "content": c.message}
+        for c in history
+        if summary is None or c.id > summary.through_id
+    ]
     
     context = {
         "user_name": user.full_name,
@@ -63,78 +192,110 @@ def get_user_context(db: Session, user: User) -> dict:
         "shortlisted_universities": shortlist_info,
         "locked_universities": [s for s in shortlist_info if s.get("is_locked")],
         "pending_tasks": task_info,
-        "conversation_history": history_messages
+        "conversation_summary": summary.message if summary else None,
+        "conversation_history": history_messages,
+        "unsummarized_history": unsummarized
     }
     
     if profile:
-        context["profile"] = {
-            "education_level": profile.education_level,
-            "degree": profile.degree,
-            "major": profile.major,
-            "graduation_year": profile.graduation_year,
-            "gpa": profile.gpa,
-            "intended_degree": profile.intended_degree,
-            "field_of_study": profile.field_of_study,
-            "target_intake": profile.target_intake,
-            "preferred_countries": profile.preferred_countries,
-            "budget_min": profile.budget_min,
-            "budget_max": profile.budget_max,
-            "funding_type": profile.funding_type,
-            "ielts_status": profile.ielts_status,
-            "ielts_score": profile.ielts_score,
-            "gre_status": profile.gre_status,
-            "gre_score": profile.gre_score,
-            "sop_status": profile.sop_status
-        }
+        context["profile"] = profile._asdict()
     
     return context
 
 
+ONBOARDING_REQUIRED_REPLY = {
+    "message": "Please complete your onboarding first to unlock the AI Counsellor. I need to understand your background to provide personalized guidance.",
+    "actions": None,
+    "suggestions": ["Complete Onboarding"]
+}
+
+
+async def _release_connection(db: AsyncSession) -> None:
+    """End the read-only transaction so no pooled connection is held during the Gemini call"""
+    # Nothing is pending, so this is a bare COMMIT; unlike rollback() it leaves loaded objects unexpired
+    await db.commit()
+
+
+# Streamed turns save the user's message in a task; strong references keep one alive
+# until it finishes, even if the client disconnects and the response is torn down
+_pending_saves = set()
+
+
+def _save_finished(task: asyncio.Task) -> None:
+    _pending_saves.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Error saving chat message", exc_info=task.exception())
+
+
+async def _persist_user_message(user_id: int, text: str) -> int:
+    """Insert the user's message in a session of its own so it can run alongside the Gemini call"""
+    async with AsyncSessionLocal() as db:
+        user_message = Conversation(user_id=user_id, message=text, role="user")
+        db.add(user_message)
+        await db.commit()
+        return user_message.id
+
+
+async def _save_reply(
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    gemini: GeminiService,
+    user: User,
+    context: dict,
+    user_message_id: int,
+    user_text: str,
+    reply_text: str
+) -> None:
+    """Save the AI reply and schedule a history summary once it's due"""
+    ai_message = Conversation(user_id=user.id, message=reply_text, role="assistant")
+    db.add(ai_message)
+    await db.commit()
+    _remember_messages(
+        user.id,
+        HistoryEntry(user_message_id, "user", user_text),
+        HistoryEntry(ai_message.id, "assistant", reply_text)
+    )
+    
+    # Fold older turns into the rolling summary once they outgrow the prompt budget
+    turns = context["unsummarized_history"] + [
+        {"role": "user", "content": user_text},
+        {"role": "assistant", "content": reply_text}
+    ]
+    if gemini.needs_history_summary(turns):
+        background_tasks.add_task(
+            _summarize_history_bg, gemini, user.id, context["conversation_summary"], turns, ai_message.id
+        )
+    
+    # Queued for the log listener thread, so the event loop never waits on stdout
+    logger.info("Chat user=%s\n👤 USER: %s\n🤖 AI: %s", user.id, user_text, reply_text)
+
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_with_counsellor(
     message: ChatMessage,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    gemini: GeminiService = Depends(get_gemini)
 ):
     """Chat with AI Counsellor"""
     # Check if onboarding is complete
     if not current_user.onboarding_completed:
-        return ChatResponse(
-            message="Please complete your onboarding first to unlock the AI Counsellor. I need to understand your background to provide personalized guidance.",
-            actions=None,
-            suggestions=["Complete Onboarding"]
-        )
+        return ChatResponse(**ONBOARDING_REQUIRED_REPLY)
     
     # Get user context
-    context = get_user_context(db, current_user)
+    context = await get_user_context(db, current_user)
+    await _release_connection(db)
     
-    # Save user message
-    user_message = Conversation(
-        user_id=current_user.id,
-        message=message.message,
-        role="user"
+    # Get AI response; the user's message is stored while we wait on it
+    user_message_id, response = await asyncio.gather(
+        _persist_user_message(current_user.id, message.message),
+        gemini.get_counsellor_response(message.message, context)
     )
-    db.add(user_message)
-    db.commit()
-    
-    # Get AI response
-    gemini = GeminiService()
-    response = await gemini.get_counsellor_response(message.message, context)
-    
-    # Save AI response
-    ai_message = Conversation(
-        user_id=current_user.id,
-        message=response["message"],
-        role="assistant"
+    await _save_reply(
+        db, background_tasks, gemini, current_user, context,
+        user_message_id, message.message, response["message"]
     )
-    db.add(ai_message)
-    db.commit()
-    
-    # Log conversation to terminal
-    print("\n" + "="*50)
-    print(f"👤 USER: {message.message}")
-    print(f"🤖 AI: {response['message']}")
-    print("="*50 + "\n")
     
     return ChatResponse(
         message=response["message"],
@@ -143,41 +304,92 @@ async def chat_with_counsellor(
     )
 
 
+# Buffering proxies (nginx honours X-Accel-Buffering) would hold every chunk until the reply ends
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse(event: dict) -> bytes:
+    return b"data: " + orjson.dumps(event) + b"\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_with_counsellor_stream(
+    message: ChatMessage,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+    gemini: GeminiService = Depends(get_gemini)
+):
+    """Chat with AI Counsellor, streaming the reply as server-sent events"""
+    if not current_user.onboarding_completed:
+        async def events():
+            yield _sse({"delta": ONBOARDING_REQUIRED_REPLY["message"]})
+            yield _sse({"done": True, **ONBOARDING_REQUIRED_REPLY})
+    else:
+        context = await get_user_context(db, current_user)
+        await _release_connection(db)
+        save_user_message = asyncio.create_task(_persist_user_message(current_user.id, message.message))
+        _pending_saves.add(save_user_message)
+        save_user_message.add_done_callback(_save_finished)
+        
+        async def events():
+            try:
+                async for event in gemini.stream_counsellor_response(message.message, context):
+                    if event.get("done"):
+                        await _save_reply(
+                            db, background_tasks, gemini, current_user, context,
+                            await save_user_message, message.message, event["message"]
+                        )
+                    yield _sse(event)
+            finally:
+                # The client may leave before the done frame; the user's message still
+                # lands, and shield keeps the stream's cancellation from reaching the insert
+                try:
+                    await asyncio.shield(save_user_message)
+                except Exception:
+                    pass  # already logged by _save_finished
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def _summarize_history_bg(
+    gemini: GeminiService,
+    user_id: int,
+    previous_summary: Optional[str],
+    turns: list,
+    through_id: int
+):
+    """Background job: store a new rolling summary in a session of its own"""
+    summary = await gemini.summarize_history(previous_summary, turns)
+    if not summary:
+        return
+    
+    async with AsyncSessionLocal() as db:
+        try:
+            # Messages saved while the summary was generated get ids past through_id,
+            # so they stay in the raw history instead of being hidden unsummarized
+            db.add(Conversation(
+                user_id=user_id, message=summary, role=SUMMARY_ROLE, summary_through_id=through_id
+            ))
+            await db.commit()
+        except Exception as e:
+            logger.warning("Error saving conversation summary: %s", e)
+            await db.rollback()
+
+
 @router.post("/voice-onboarding", response_model=VoiceOnboardingResponse)
 async def voice_onboarding(
     voice_data: VoiceOnboardingMessage,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    gemini: GeminiService = Depends(get_gemini)
 ):
     """Process voice onboarding input"""
-    gemini = GeminiService()
-    
     # Get current profile state
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    if not profile:
-        profile = Profile(user_id=current_user.id)
-        db.add(profile)
-        db.commit()
-    
-    current_profile = {
-        "education_level": profile.education_level,
-        "degree": profile.degree,
-        "major": profile.major,
-        "graduation_year": profile.graduation_year,
-        "gpa": profile.gpa,
-        "intended_degree": profile.intended_degree,
-        "field_of_study": profile.field_of_study,
-        "target_intake": profile.target_intake,
-        "preferred_countries": profile.preferred_countries,
-        "budget_min": profile.budget_min,
-        "budget_max": profile.budget_max,
-        "funding_type": profile.funding_type,
-        "ielts_status": profile.ielts_status,
-        "ielts_score": profile.ielts_score,
-        "gre_status": profile.gre_status,
-        "gre_score": profile.gre_score,
-        "sop_status": profile.sop_status
-    }
+    profile = await _context_profile(db, current_user.id)
+    current_profile = profile._asdict() if profile else dict.fromkeys(CONTEXT_PROFILE_KEYS)
+    
+    await _release_connection(db)
     
     # Process with AI
     response = await gemini.process_voice_onboarding(
@@ -186,19 +398,19 @@ async def voice_onboarding(
         current_profile=current_profile
     )
     
-    # Update profile with extracted data
-    if response.get("extracted_data"):
-        for field, value in response["extracted_data"].items():
-            if hasattr(profile, field) and value is not None:
-                setattr(profile, field, value)
-        db.commit()
+    # Update profile with extracted data, creating it on the first step; the bulk
+    # upsert binds values as-is and asyncpg rejects e.g. "2025" for an Integer column
+    values = clean_profile_values(response.get("extracted_data") or {})
+    if values or profile is None:
+        await upsert_profile(db, current_user.id, values)
     
     # Check if onboarding is complete
     is_complete = response.get("is_complete", False)
     if is_complete:
         current_user.onboarding_completed = True
         current_user.current_stage = 2
-        db.commit()
+    
+    await db.commit()
     
     return VoiceOnboardingResponse(
         response_text=response["response_text"],
@@ -212,35 +424,29 @@ async def voice_onboarding(
 async def ai_shortlist_action(
     university_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """AI action: Add university to shortlist"""
     # Check if university exists
-    university = db.query(University).filter(University.id == university_id).first()
+    university = await university_catalog.get(db, university_id)
     if not university:
         raise HTTPException(status_code=404, detail="University not found")
     
-    # Check if already shortlisted
-    existing = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id,
-        ShortlistedUniversity.university_id == university_id
-    ).first()
+    # Insert unless already shortlisted; the unique (user_id, university_id) index decides
+    shortlisted_id = (await db.execute(
+        dialect_insert(ShortlistedUniversity)
+        .values(user_id=current_user.id, university_id=university_id, category="target")
+        .on_conflict_do_nothing(index_elements=["user_id", "university_id"])
+        .returning(ShortlistedUniversity.id)
+    )).scalar_one_or_none()
     
-    if existing:
+    if shortlisted_id is None:
         return {"message": f"{university.name} is already in your shortlist", "success": False}
     
-    # Add to shortlist
-    shortlisted = ShortlistedUniversity(
-        user_id=current_user.id,
-        university_id=university_id,
-        category="target"
-    )
-    db.add(shortlisted)
-    
     if current_user.current_stage < 3:
         current_user.current_stage = 3
     
-    db.commit()
+    await db.commit()
     
     return {"message": f"Added {university.name} to your shortlist!", "success": True}
 
@@ -249,13 +455,16 @@ async def ai_shortlist_action(
 async def ai_lock_action(
     university_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """AI action: Lock a university"""
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id,
-        ShortlistedUniversity.university_id == university_id
-    ).first()
+    result = await db.execute(
+        select(ShortlistedUniversity).where(
+            ShortlistedUniversity.user_id == current_user.id,
+            ShortlistedUniversity.university_id == university_id
+        )
+    )
+    shortlisted = result.scalars().first()
     
     if not shortlisted:
         return {"message": "Please add this university to your shortlist first", "success": False}
@@ -263,13 +472,18 @@ async def ai_lock_action(
     if shortlisted.is_locked:
         return {"message": "This university is already locked", "success": False}
     
-    university = db.query(University).filter(University.id == university_id).first()
+    # Name from the in-process catalog rather than a second SELECT
+    university = await university_catalog.get(db, university_id)
+    if not university:
+        raise HTTPException(status_code=404, detail="University not found")
     
     shortlisted.is_locked = True
-    shortlisted.locked_at = datetime.utcnow()
-    current_user.current_stage = 4
+    shortlisted.locked_at = func.now()
+    # Only dirty the user row when the stage actually moves
+    if current_user.current_stage != 4:
+        current_user.current_stage = 4
     
-    db.commit()
+    await db.commit()
     
     return {"message": f"Locked {university.name}! Application guidance is now available.", "success": True}
 
@@ -280,7 +494,7 @@ async def ai_create_task_action(
     description: str = None,
     priority: str = "medium",
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """AI action: Create a task"""
     task = Task(
@@ -291,42 +505,48 @@ async def ai_create_task_action(
         category="general"
     )
     db.add(task)
-    db.commit()
+    await db.commit()
     
     return {"message": f"Created task: {title}", "success": True, "task_id": task.id}
 
 
-@router.get("/history")
+@router.get("/history", response_model=List[ConversationMessage])
 async def get_conversation_history(
     limit: int = 50,
+    before_id: Optional[int] = Query(None, description="Return messages older than this id (the first id of the previous page)"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get conversation history"""
-    history = db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).order_by(Conversation.created_at.desc()).limit(limit).all()
-    
-    return [
-        {
-            "id": c.id,
-            "role": c.role,
-            "message": c.message,
-            "created_at": c.created_at
-        }
-        for c in reversed(history)
-    ]
+    """Get conversation history, newest page first"""
+    # Keyset pagination on the (user_id, id) index instead of OFFSET; ids
+    # increase with insertion so they order messages even on timestamp ties
+    query = select(Conversation).where(
+        Conversation.user_id == current_user.id,
+        Conversation.role != SUMMARY_ROLE
+    )
+    if before_id is not None:
+        query = query.where(Conversation.id < before_id)
+    
+    result = await db.execute(query.order_by(Conversation.id.desc()).limit(limit))
+    history = result.scalars().all()
+    
+    return list(reversed(history))
 
 
 @router.delete("/history")
 async def clear_conversation_history(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Clear conversation history"""
-    db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).delete()
-    db.commit()
+    # Plain bulk DELETE; nothing in this session holds Conversation rows to sync
+    await db.execute(
+        delete(Conversation)
+        .where(Conversation.user_id == current_user.id)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    _touch_history(current_user.id)
+    _recent_history.pop(current_user.id, None)
     
     return {"message": "Conversation history cleared"}
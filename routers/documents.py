@@ -3,62 +3,130 @@ Documents Router
 Handle file uploads and document management
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import os
 import shutil
-from datetime import datetime
+import asyncio
+import mimetypes
+import secrets
+import logging
+import aiofiles
+import aiofiles.os
 
-from database import get_db
+from database import get_db, stream_json_array
 import models
 import schemas
 from routers.auth import get_current_user
+from services.storage_service import StorageService
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+storage = StorageService()
+
+# Columns backing DocumentResponse, so list reads skip building ORM instances
+_DOCUMENT_RESPONSE_COLUMNS = (
+    models.Document.id, models.Document.user_id, models.Document.name,
+    models.Document.type, models.Document.size, models.Document.category,
+    models.Document.status, models.Document.file_path,
+    models.Document.created_at, models.Document.updated_at
+)
 
 UPLOAD_DIR = "uploads"
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB per read/write
 if not os.path.exists(UPLOAD_DIR):
     os.makedirs(UPLOAD_DIR)
 
+# Common upload types resolved without a mimetypes table scan
+CONTENT_TYPE_TO_EXT = {
+    "application/pdf": "PDF",
+    "application/msword": "DOC",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "DOCX",
+    "image/jpeg": "JPG",
+    "image/png": "PNG",
+    "text/plain": "TXT",
+}
+
+
+def _format_size(size: int) -> str:
+    """Human readable file size, e.g. 2.4 MB"""
+    if size > 1024 * 1024:
+        return f"{round(size / (1024 * 1024), 2)} MB"
+    return f"{round(size / 1024, 1)} KB"
+
+
+def _file_type(content_type: Optional[str], filename: str) -> str:
+    """Short upper-case file type from the content type or file extension"""
+    file_type = CONTENT_TYPE_TO_EXT.get(content_type)
+    if file_type:
+        return file_type
+    ext = (content_type and mimetypes.guess_extension(content_type)) or os.path.splitext(filename)[1]
+    return ext.replace(".", "").upper()
+
+
+def _copy_spooled_upload(src, file_path: str) -> int:
+    """Copy an upload spool that rolled over to disk, kernel-side where possible"""
+    src.seek(0)
+    with open(file_path, "wb") as out:
+        try:
+            # Zero-copy between file descriptors (Linux)
+            copied = 0
+            while sent := os.sendfile(out.fileno(), src.fileno(), copied, UPLOAD_CHUNK_SIZE * 16):
+                copied += sent
+            return copied
+        except (AttributeError, OSError):
+            # sendfile unavailable for files on this platform
+            src.seek(0)
+            out.seek(0)
+            out.truncate()
+            shutil.copyfileobj(src, out, length=UPLOAD_CHUNK_SIZE)
+            return out.tell()
+
 @router.get("/", response_model=List[schemas.DocumentResponse])
 async def get_documents(
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all documents for the current user"""
-    documents = db.query(models.Document).filter(models.Document.user_id == current_user.id).all()
-    return documents
+    query = select(*_DOCUMENT_RESPONSE_COLUMNS).where(models.Document.user_id == current_user.id)
+    return StreamingResponse(
+        stream_json_array(db, query, schemas.DocumentResponse),
+        media_type="application/json"
+    )
 
 @router.post("/upload", response_model=schemas.DocumentResponse)
 async def upload_document(
     file: UploadFile = File(...),
     category: str = Form("academic"),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload a document
     """
-    # Create valid filename
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    clean_filename = f"{current_user.id}_{timestamp}_{file.filename}"
+    # Random stored name: collision-free and never derived from user input
+    # beyond the extension; the original name is kept in the DB record
+    ext = os.path.splitext(os.path.basename(file.filename or ""))[1].lower()
+    clean_filename = f"{current_user.id}_{secrets.token_hex(8)}{ext}"
     file_path = os.path.join(UPLOAD_DIR, clean_filename)
     
-    # Save file locally
+    # Save file without blocking the event loop
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        # Get file size
-        file_size = os.path.getsize(file_path)
-        size_str = f"{round(file_size / 1024, 1)} KB"
-        if file_size > 1024 * 1024:
-            size_str = f"{round(file_size / (1024 * 1024), 2)} MB"
+        if getattr(file.file, "_rolled", False):
+            # Large upload already spooled to a temp file: copy fd-to-fd
+            file_size = await asyncio.to_thread(_copy_spooled_upload, file.file, file_path)
+        else:
+            file_size = 0
+            async with aiofiles.open(file_path, "wb") as out:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    await out.write(chunk)
             
-        # Determine type
-        import mimetypes
-        file_type = mimetypes.guess_extension(file.content_type) or os.path.splitext(file.filename)[1]
-        file_type = file_type.replace(".", "").upper()
+        # Size is counted while copying, no extra stat needed
+        size_str = _format_size(file_size)
+        file_type = _file_type(file.content_type, file.filename)
             
         # Create DB record
         new_doc = models.Document(
@@ -72,38 +140,102 @@ async def upload_document(
         )
         
         db.add(new_doc)
-        db.commit()
-        db.refresh(new_doc)
+        await db.commit()
+        await db.refresh(new_doc)
         
         return new_doc
         
-    except Exception as e:
-        print(f"Upload error: {e}")
+    except Exception:
+        logger.exception("Upload error")
         raise HTTPException(status_code=500, detail="Could not save file")
 
+@router.post("/upload-url", response_model=schemas.DocumentUploadUrlResponse)
+async def create_upload_url(
+    upload_request: schemas.DocumentUploadUrlRequest,
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Get a presigned S3 POST so the client uploads directly to object storage
+    """
+    if not storage.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Direct uploads are not configured. Use /upload instead."
+        )
+    
+    return storage.presign_upload(current_user.id, upload_request.filename, upload_request.content_type)
+
+@router.post("/complete", response_model=schemas.DocumentResponse)
+async def complete_upload(
+    upload_data: schemas.DocumentUploadComplete,
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Record a document once its direct S3 upload has finished
+    """
+    if not storage.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Direct uploads are not configured. Use /upload instead."
+        )
+    
+    if not upload_data.key.startswith(storage.user_prefix(current_user.id)):
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    
+    # Trust S3 for size/type rather than the client
+    head = await asyncio.to_thread(storage.head, upload_data.key)
+    if head is None:
+        raise HTTPException(status_code=400, detail="Upload not found")
+    
+    new_doc = models.Document(
+        user_id=current_user.id,
+        name=upload_data.name,
+        type=_file_type(head.get("ContentType"), upload_data.name),
+        size=_format_size(head["ContentLength"]),
+        category=upload_data.category,
+        status="pending",
+        file_path=storage.url_for(upload_data.key)
+    )
+    
+    db.add(new_doc)
+    await db.commit()
+    await db.refresh(new_doc)
+    
+    return new_doc
+
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: int,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a document"""
-    doc = db.query(models.Document).filter(
-        models.Document.id == document_id,
-        models.Document.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(models.Document).where(
+            models.Document.id == document_id,
+            models.Document.user_id == current_user.id
+        )
+    )
+    doc = result.scalar_one_or_none()
     
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
         
-    # Delete physical file
-    if doc.file_path and os.path.exists(doc.file_path):
+    # Delete stored object or physical file
+    s3_key = storage.key_from_url(doc.file_path) if storage.enabled and doc.file_path else None
+    if s3_key:
         try:
-            os.remove(doc.file_path)
+            await asyncio.to_thread(storage.delete, s3_key)
         except Exception:
+            pass # Ignore if object already missing
+    elif doc.file_path:
+        try:
+            await aiofiles.os.remove(doc.file_path)
+        except OSError:
             pass # Ignore if file already missing
             
-    db.delete(doc)
-    db.commit()
+    await db.delete(doc)
+    await db.commit()
     
     return {"message": "Document deleted"}
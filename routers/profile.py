@@ -2,12 +2,15 @@
 Profile Router
 Onboarding and profile management endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-import json
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select, insert, bindparam, func, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import hashlib
 
-from database import get_db
-from models import User, Profile, Task
+from database import get_db, dialect_insert
+from models import User, Profile, Task, ShortlistedUniversity, Priority, parse_string_list
 from schemas import (
     ProfileCreate, 
     ProfileUpdate, 
@@ -21,6 +24,80 @@ from auth import get_current_user
 
 router = APIRouter()
 
+# Built once and shared by every router that needs the caller's profile, so
+# each lookup reuses one compiled statement
+_GET_PROFILE = select(Profile).where(Profile.user_id == bindparam("uid"))
+
+RECENT_TASKS_LIMIT = 10
+
+# Dashboard queries, likewise compiled once
+_SHORTLIST_COUNTS = select(
+    func.count(),
+    func.count(case((ShortlistedUniversity.is_locked == True, 1)))
+).where(ShortlistedUniversity.user_id == bindparam("uid"))
+
+_TASK_COUNTS = select(
+    func.count(case((Task.is_completed == False, 1))),
+    func.count(case((Task.is_completed == True, 1)))
+).where(Task.user_id == bindparam("uid"))
+
+# Only the columns TaskResponse exposes; plain rows, no Task objects to hydrate
+_RECENT_TASKS = select(*(getattr(Task, field) for field in TaskResponse.model_fields)).where(
+    Task.user_id == bindparam("uid"),
+    Task.is_completed == False
+).order_by(Task.priority_rank.desc(), Task.created_at.desc()).limit(RECENT_TASKS_LIMIT)
+
+# Profile columns a client or the AI may write
+PROFILE_FIELDS = frozenset(Profile.__table__.columns.keys()) - {"id", "user_id", "created_at", "updated_at"}
+
+
+def clean_profile_values(raw: dict) -> dict:
+    """Coerce untrusted field values (e.g. AI-extracted "3.8") to column types, dropping any that fail"""
+    values = {}
+    for field, value in raw.items():
+        if field not in PROFILE_FIELDS or value is None:
+            continue
+        # Field by field, so one bad value doesn't discard the rest
+        try:
+            values.update(ProfileUpdate.model_validate({field: value}).model_dump(exclude_unset=True))
+        except ValidationError:
+            continue
+    return values
+
+
+async def fetch_profile(db: AsyncSession, user_id: int) -> Optional[Profile]:
+    """Load a user's profile, or None if onboarding has not created one"""
+    return (await db.execute(_GET_PROFILE, {"uid": user_id})).scalar_one_or_none()
+
+
+def etag_response(request: Request, model: BaseModel) -> Response:
+    """JSON response with a content ETag; 304 when the client already holds this body"""
+    body = model.model_dump_json().encode()
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def upsert_profile(db: AsyncSession, user_id: int, values: dict) -> Profile:
+    """Create or update a user's profile in one statement and return the stored row"""
+    # Core statements skip the Profile validator that accepts the legacy string form
+    if isinstance(values.get("preferred_countries"), str):
+        values = {**values, "preferred_countries": parse_string_list(values["preferred_countries"])}
+    
+    stmt = dialect_insert(Profile).values(user_id=user_id, **values)
+    # With nothing to change, a no-op SET still returns the existing row
+    set_ = {**values, "updated_at": func.now()} if values else {"user_id": stmt.excluded.user_id}
+    stmt = stmt.on_conflict_do_update(index_elements=[Profile.user_id], set_=set_).returning(Profile)
+    profile = (await db.execute(stmt, execution_options={"populate_existing": True})).scalar_one()
+    
+    # Bulk writes bypass the mapper events that evict cached recommendations;
+    # queue the eviction for the after_commit listener in routers.universities
+    db.info.setdefault("evicted_recommendation_user_ids", set()).add(user_id)
+    return profile
+
 
 def calculate_profile_strength(profile: Profile) -> ProfileStrength:
     """Calculate profile strength based on completed fields"""
@@ -59,7 +136,8 @@ def calculate_profile_strength(profile: Profile) -> ProfileStrength:
     overall += 20 if sop == "ready" else (10 if sop == "draft" else 0)
     overall += 20 if profile.preferred_countries else 0
     
-    return ProfileStrength(
+    # Every value is computed above, so skip re-validating them
+    return ProfileStrength.model_construct(
         academics=academics,
         exams=exams,
         sop=sop,
@@ -70,10 +148,10 @@ def calculate_profile_strength(profile: Profile) -> ProfileStrength:
 @router.get("/", response_model=ProfileResponse)
 async def get_profile(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get current user's profile"""
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    profile = await fetch_profile(db, current_user.id)
     if not profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -86,21 +164,14 @@ async def get_profile(
 async def update_profile(
     profile_data: ProfileUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update user profile"""
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    if not profile:
-        profile = Profile(user_id=current_user.id)
-        db.add(profile)
-    
-    # Update only provided fields
+    # Update only provided fields, creating the profile if needed
     update_data = profile_data.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(profile, field, value)
+    profile = await upsert_profile(db, current_user.id, update_data)
     
-    db.commit()
-    db.refresh(profile)
+    await db.commit()
     return profile
 
 
@@ -108,107 +179,94 @@ async def update_profile(
 async def complete_onboarding(
     onboarding_data: OnboardingComplete,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Complete onboarding and save profile"""
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    if not profile:
-        profile = Profile(user_id=current_user.id)
-        db.add(profile)
-    
     # Update profile with onboarding data
     update_data = onboarding_data.profile.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(profile, field, value)
+    profile = await upsert_profile(db, current_user.id, update_data)
     
     # Mark onboarding as complete
     current_user.onboarding_completed = True
     current_user.current_stage = 2  # Move to Stage 2: Discovering Universities
     
-    db.commit()
-    db.refresh(profile)
-    
-    # Create initial tasks
-    create_initial_tasks(db, current_user.id, profile)
+    # Create initial tasks in the same commit
+    await create_initial_tasks(db, current_user.id, profile)
     
+    await db.commit()
     return profile
 
 
-def create_initial_tasks(db: Session, user_id: int, profile: Profile):
+async def create_initial_tasks(db: AsyncSession, user_id: int, profile: Profile):
     """Create initial tasks based on profile"""
     tasks_to_create = []
     
     # Exam tasks
     if profile.ielts_status != "completed":
-        tasks_to_create.append(Task(
-            user_id=user_id,
-            title="Prepare for IELTS/TOEFL",
-            description="Register and prepare for English proficiency test",
-            category="exam",
-            priority="high"
-        ))
+        tasks_to_create.append({
+            "title": "Prepare for IELTS/TOEFL",
+            "description": "Register and prepare for English proficiency test",
+            "category": "exam",
+            "priority": "high"
+        })
     
     if profile.gre_status != "completed" and profile.intended_degree in ["masters", "phd"]:
-        tasks_to_create.append(Task(
-            user_id=user_id,
-            title="Prepare for GRE",
-            description="Register and prepare for GRE exam",
-            category="exam",
-            priority="high"
-        ))
+        tasks_to_create.append({
+            "title": "Prepare for GRE",
+            "description": "Register and prepare for GRE exam",
+            "category": "exam",
+            "priority": "high"
+        })
     
     # SOP task
     if profile.sop_status != "ready":
-        tasks_to_create.append(Task(
-            user_id=user_id,
-            title="Draft Statement of Purpose",
-            description="Write the first draft of your SOP",
-            category="document",
-            priority="medium"
-        ))
+        tasks_to_create.append({
+            "title": "Draft Statement of Purpose",
+            "description": "Write the first draft of your SOP",
+            "category": "document",
+            "priority": "medium"
+        })
     
     # General tasks
-    tasks_to_create.append(Task(
-        user_id=user_id,
-        title="Research universities",
-        description="Use AI Counsellor to discover matching universities",
-        category="general",
-        priority="high"
-    ))
+    tasks_to_create.append({
+        "title": "Research universities",
+        "description": "Use AI Counsellor to discover matching universities",
+        "category": "general",
+        "priority": "high"
+    })
     
-    for task in tasks_to_create:
-        db.add(task)
-    db.commit()
+    # One executemany INSERT; Core skips @validates, so priority_rank is set explicitly
+    await db.execute(insert(Task), [
+        {**task, "user_id": user_id, "priority_rank": int(Priority.from_label(task["priority"]))}
+        for task in tasks_to_create
+    ])
 
 
 @router.get("/dashboard", response_model=DashboardResponse)
 async def get_dashboard(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get dashboard data for current user"""
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    profile = await fetch_profile(db, current_user.id)
     
     # Calculate profile strength
     profile_strength = None
     if profile:
         profile_strength = calculate_profile_strength(profile)
     
-    # Count shortlisted and locked universities
-    from models import ShortlistedUniversity
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id
-    ).all()
-    
-    shortlisted_count = len(shortlisted)
-    locked_count = len([s for s in shortlisted if s.is_locked])
+    # Count shortlisted and locked universities in SQL
+    shortlisted_count, locked_count = (await db.execute(_SHORTLIST_COUNTS, {"uid": current_user.id})).one()
     
     # Count tasks
-    tasks = db.query(Task).filter(Task.user_id == current_user.id).all()
-    pending_tasks = len([t for t in tasks if not t.is_completed])
-    completed_tasks = len([t for t in tasks if t.is_completed])
+    pending_tasks, completed_tasks = (await db.execute(_TASK_COUNTS, {"uid": current_user.id})).one()
     
-    return DashboardResponse(
+    result = await db.execute(_RECENT_TASKS, {"uid": current_user.id})
+    recent_tasks = result.all()
+    
+    # Polled by the client: an unchanged dashboard goes back as a bodiless 304
+    return etag_response(request, DashboardResponse(
         user=current_user,
         profile=profile,
         profile_strength=profile_strength,
@@ -216,20 +274,21 @@ async def get_dashboard(
         locked_count=locked_count,
         pending_tasks=pending_tasks,
         completed_tasks=completed_tasks,
-        recent_tasks=[t for t in tasks if not t.is_completed]
-    )
+        recent_tasks=recent_tasks
+    ))
 
 
 @router.get("/strength", response_model=ProfileStrength)
 async def get_profile_strength(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get profile strength analysis"""
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    profile = await fetch_profile(db, current_user.id)
     if not profile:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Profile not found"
         )
-    return calculate_profile_strength(profile)
+    return etag_response(request, calculate_profile_strength(profile))
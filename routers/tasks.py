@@ -3,47 +3,102 @@ Tasks Router
 To-do management endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update, func, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
-from database import get_db
-from models import User, Task
+from database import get_db, stream_json_array
+from models import User, Task, Priority
 from schemas import TaskCreate, TaskUpdate, TaskResponse
 from auth import get_current_user
 
 router = APIRouter()
 
+# Built once so every lookup hits SQLAlchemy's compiled statement cache
+_GET_TASK = select(Task).where(
+    Task.id == bindparam("id"),
+    Task.user_id == bindparam("uid")
+)
+
+# Columns backing TaskResponse, so list reads skip building ORM instances
+_TASK_RESPONSE_COLUMNS = (
+    Task.id, Task.user_id, Task.university_id, Task.title, Task.description,
+    Task.category, Task.priority, Task.due_date, Task.is_completed,
+    Task.completed_at, Task.created_at
+)
+
+
+async def _get_owned_task(db: AsyncSession, task_id: int, user_id: int) -> Task:
+    """Fetch a task owned by the user or raise 404"""
+    result = await db.execute(_GET_TASK, {"id": task_id, "uid": user_id})
+    task = result.scalar_one_or_none()
+    
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    
+    return task
+
+
+async def _update_owned_task(db: AsyncSession, task_id: int, user_id: int, **values) -> Task:
+    """Update a task owned by the user in one UPDATE ... RETURNING or raise 404"""
+    stmt = (
+        update(Task)
+        .where(Task.id == task_id, Task.user_id == user_id)
+        .values(**values)
+        .returning(Task)
+        .execution_options(synchronize_session=False)
+    )
+    task = (await db.execute(stmt)).scalar_one_or_none()
+    
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Task not found"
+        )
+    
+    await db.commit()
+    return task
+
 
 @router.get("/", response_model=List[TaskResponse])
 async def get_tasks(
     category: Optional[str] = Query(None),
     is_completed: Optional[bool] = Query(None),
     university_id: Optional[int] = Query(None),
+    priority: Optional[str] = Query(None, pattern="^(low|medium|high)$"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all tasks for current user"""
-    query = db.query(Task).filter(Task.user_id == current_user.id)
+    query = select(*_TASK_RESPONSE_COLUMNS).where(Task.user_id == current_user.id)
     
     if category:
-        query = query.filter(Task.category == category)
+        query = query.where(Task.category == category)
     
     if is_completed is not None:
-        query = query.filter(Task.is_completed == is_completed)
+        query = query.where(Task.is_completed == is_completed)
     
     if university_id:
-        query = query.filter(Task.university_id == university_id)
+        query = query.where(Task.university_id == university_id)
+    
+    if priority:
+        # Integer equality on the (user_id, priority_rank, created_at) index
+        query = query.where(Task.priority_rank == int(Priority.from_label(priority)))
     
-    tasks = query.order_by(Task.priority.desc(), Task.created_at.desc()).all()
-    return tasks
+    query = query.order_by(Task.priority_rank.desc(), Task.created_at.desc())
+    return StreamingResponse(stream_json_array(db, query, TaskResponse), media_type="application/json")
 
 
 @router.post("/", response_model=TaskResponse)
 async def create_task(
     task_data: TaskCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create a new task"""
     task = Task(
@@ -56,8 +111,8 @@ async def create_task(
         due_date=task_data.due_date
     )
     db.add(task)
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 
@@ -65,21 +120,10 @@ async def create_task(
 async def get_task(
     task_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific task"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.user_id == current_user.id
-    ).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found"
-        )
-    
-    return task
+    return await _get_owned_task(db, task_id, current_user.id)
 
 
 @router.put("/{task_id}", response_model=TaskResponse)
@@ -87,19 +131,10 @@ async def update_task(
     task_id: int,
     task_data: TaskUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a task"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.user_id == current_user.id
-    ).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found"
-        )
+    task = await _get_owned_task(db, task_id, current_user.id)
     
     update_data = task_data.model_dump(exclude_unset=True)
     
@@ -113,8 +148,8 @@ async def update_task(
     for field, value in update_data.items():
         setattr(task, field, value)
     
-    db.commit()
-    db.refresh(task)
+    await db.commit()
+    await db.refresh(task)
     return task
 
 
@@ -122,22 +157,13 @@ async def update_task(
 async def delete_task(
     task_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a task"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.user_id == current_user.id
-    ).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found"
-        )
+    task = await _get_owned_task(db, task_id, current_user.id)
     
-    db.delete(task)
-    db.commit()
+    await db.delete(task)
+    await db.commit()
     
     return {"message": "Task deleted"}
 
@@ -146,49 +172,25 @@ async def delete_task(
 async def complete_task(
     task_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Mark a task as complete"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.user_id == current_user.id
-    ).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found"
-        )
-    
-    task.is_completed = True
-    task.completed_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(task)
-    return task
+    return await _update_owned_task(
+        db, task_id, current_user.id,
+        is_completed=True,
+        completed_at=func.now()
+    )
 
 
 @router.post("/{task_id}/uncomplete", response_model=TaskResponse)
 async def uncomplete_task(
     task_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Mark a task as incomplete"""
-    task = db.query(Task).filter(
-        Task.id == task_id,
-        Task.user_id == current_user.id
-    ).first()
-    
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Task not found"
-        )
-    
-    task.is_completed = False
-    task.completed_at = None
-    
-    db.commit()
-    db.refresh(task)
-    return task
+    return await _update_owned_task(
+        db, task_id, current_user.id,
+        is_completed=False,
+        completed_at=None
+    )
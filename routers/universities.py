@@ -2,14 +2,19 @@
 Universities Router
 University discovery, shortlisting, and locking endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select, insert, update, delete, exists, case, event, func
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime
-import json
+from bisect import bisect_right
+from cachetools import TTLCache
+import logging
 
-from database import get_db
-from models import User, Profile, University, ShortlistedUniversity, Task
+from database import get_db, dialect_insert, AsyncSessionLocal
+from models import User, Profile, University, ShortlistedUniversity, Task, Priority
 from schemas import (
     UniversityResponse, 
     ShortlistCreate, 
@@ -19,147 +24,216 @@ from schemas import (
     UnlockUniversityRequest,
     UpdateApplicationStatus
 )
-from auth import get_current_user
+from auth import get_current_user, evict_cached_user
+from routers.profile import fetch_profile
+from services.university_catalog import CatalogUniversity, university_catalog
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
+# Scored recommendations as encoded JSON ({user_id: {(limit, offset): bytes}}).
+# A user's entry is evicted when their Profile is written through the ORM or
+# upsert_profile, and everything is dropped when a University changes; other
+# worker processes may serve stale results for up to the TTL.
+_recommendations_cache = TTLCache(maxsize=10_000, ttl=300)
+_UNIVERSITY_LIST = TypeAdapter(List[UniversityResponse])
 
-def calculate_fit_score(university: University, profile: Profile) -> tuple:
-    """Calculate how well a university fits a user's profile"""
+
+@event.listens_for(Profile, "after_insert")
+@event.listens_for(Profile, "after_update")
+@event.listens_for(Profile, "after_delete")
+def _evict_cached_recommendations(mapper, connection, target):
+    _recommendations_cache.pop(target.user_id, None)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("evicted_recommendation_user_ids", set()).add(target.user_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _evict_committed_recommendations(session):
+    # Evict again after commit in case a concurrent request re-cached old results
+    for user_id in session.info.pop("evicted_recommendation_user_ids", ()):
+        _recommendations_cache.pop(user_id, None)
+
+
+@event.listens_for(University, "after_insert")
+@event.listens_for(University, "after_update")
+@event.listens_for(University, "after_delete")
+def _clear_cached_recommendations(mapper, connection, target):
+    _recommendations_cache.clear()
+
+
+# Fit tiers, lowest to highest, and the bounds that start each next tier
+_TIERS = (("dream", "high"), ("target", "medium"), ("safe", "low"))
+_SCORE_BOUNDS = (50, 70)
+_ACCEPTANCE_BOUNDS = (15, 35)
+
+# Fit for users without a profile yet; the same for every university
+DEFAULT_FIT = (50, "target", "medium")
+
+
+def _build_profile_context(profile: Optional[Profile]) -> Optional[dict]:
+    """Profile fields used for fit scoring, prepared once per request"""
     if not profile:
-        return 50, "target", "medium"
+        return None
+    
+    # GPA bucket depends only on the profile, so resolve it once
+    gpa = profile.gpa or 0
+    if gpa >= 3.7:
+        gpa_bonus = 15
+    elif gpa >= 3.3:
+        gpa_bonus = 10
+    elif gpa >= 3.0:
+        gpa_bonus = 5
+    else:
+        gpa_bonus = 0
+    
+    return {
+        "gpa_bonus": gpa_bonus,
+        "budget_max": profile.budget_max,
+        "ielts_score": profile.ielts_score,
+        "gre_score": profile.gre_score,
+        "countries_lower": frozenset(c.lower() for c in profile.preferred_countries or ())
+    }
+
+
+def calculate_fit_score(university: CatalogUniversity, ctx: Optional[dict]) -> tuple:
+    """Calculate how well a university fits a user's profile context"""
+    if not ctx:
+        return DEFAULT_FIT
     
     score = 50  # Base score
     
     # GPA comparison (if available)
-    if profile.gpa and university.acceptance_rate:
-        if profile.gpa >= 3.7:
-            score += 15
-        elif profile.gpa >= 3.3:
-            score += 10
-        elif profile.gpa >= 3.0:
-            score += 5
+    if university.acceptance_rate:
+        score += ctx["gpa_bonus"]
     
     # Budget match
-    if profile.budget_max and university.tuition_max:
-        if profile.budget_max >= university.tuition_max:
+    if ctx["budget_max"] and university.tuition_max:
+        if ctx["budget_max"] >= university.tuition_max:
             score += 15
-        elif profile.budget_max >= university.tuition_min:
+        elif ctx["budget_max"] >= university.tuition_min:
             score += 8
         else:
             score -= 10
     
     # Exam readiness
-    if profile.ielts_score and university.ielts_requirement:
-        if profile.ielts_score >= university.ielts_requirement:
+    if ctx["ielts_score"] and university.ielts_requirement:
+        if ctx["ielts_score"] >= university.ielts_requirement:
             score += 10
         else:
             score -= 5
     
-    if profile.gre_score and university.gre_requirement:
-        if profile.gre_score >= university.gre_requirement:
+    if ctx["gre_score"] and university.gre_requirement:
+        if ctx["gre_score"] >= university.gre_requirement:
             score += 10
         else:
             score -= 5
     
     # Country preference match
-    if profile.preferred_countries:
-        try:
-            countries = json.loads(profile.preferred_countries)
-            if university.country and university.country.lower() in [c.lower() for c in countries]:
-                score += 10
-        except:
-            pass
+    if university.country_lc in ctx["countries_lower"]:
+        score += 10
     
-    # Determine category based on acceptance rate and score
+    # Tier is the stricter of the score tier and the acceptance-rate tier
+    tier = bisect_right(_SCORE_BOUNDS, score)
     if university.acceptance_rate:
-        if university.acceptance_rate < 15 or score < 50:
-            category = "dream"
-            risk = "high"
-        elif university.acceptance_rate < 35 or score < 70:
-            category = "target"
-            risk = "medium"
-        else:
-            category = "safe"
-            risk = "low"
-    else:
-        if score >= 70:
-            category = "safe"
-            risk = "low"
-        elif score >= 50:
-            category = "target"
-            risk = "medium"
-        else:
-            category = "dream"
-            risk = "high"
+        tier = min(tier, bisect_right(_ACCEPTANCE_BOUNDS, university.acceptance_rate))
+    category, risk = _TIERS[tier]
     
     return min(100, max(0, score)), category, risk
 
 
+def _university_response(university: CatalogUniversity, fit: tuple) -> UniversityResponse:
+    """Copy of a catalog snapshot with the (score, category, risk) fit filled in"""
+    fit_score, category, risk = fit
+    return university.model_copy(update={"fit_score": fit_score, "category": category, "risk_level": risk})
+
+
+def _filter_catalog(universities, country: Optional[str], budget_max: Optional[int], program: Optional[str]) -> list:
+    """Apply the listing filters to catalog snapshots (substring, case-insensitive)"""
+    if country:
+        country = country.lower()
+        universities = [u for u in universities if u.country_lc and country in u.country_lc]
+    
+    if budget_max:
+        universities = [u for u in universities if u.tuition_max is not None and u.tuition_max <= budget_max]
+    
+    if program:
+        program = program.lower()
+        universities = [u for u in universities if any(program in p.lower() for p in u.programs or ())]
+    
+    return list(universities)
+
+
 @router.get("/", response_model=List[UniversityResponse])
 async def get_universities(
     country: Optional[str] = Query(None),
     budget_max: Optional[int] = Query(None),
     program: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all universities with optional filters"""
-    query = db.query(University)
-    
-    if country:
-        query = query.filter(University.country.ilike(f"%{country}%"))
+    universities = _filter_catalog(await university_catalog.all(db), country, budget_max, program)
     
-    if budget_max:
-        query = query.filter(University.tuition_max <= budget_max)
-    
-    if program:
-        query = query.filter(University.programs.ilike(f"%{program}%"))
+    # Page by id order; fit scores are ranked within the page below
+    universities = universities[offset:offset + limit]
     
-    universities = query.all()
+    if not universities:
+        return []
     
     # Get user profile for fit calculation
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    profile = await fetch_profile(db, current_user.id)
+    
+    # No profile: every row gets the same fit, so score once and skip the sort
+    if profile is None:
+        return [_university_response(uni, DEFAULT_FIT) for uni in universities]
     
     # Add calculated fields
-    result = []
-    for uni in universities:
-        fit_score, category, risk = calculate_fit_score(uni, profile)
-        uni_dict = {
-            "id": uni.id,
-            "name": uni.name,
-            "country": uni.country,
-            "city": uni.city,
-            "ranking": uni.ranking,
-            "tuition_min": uni.tuition_min,
-            "tuition_max": uni.tuition_max,
-            "programs": uni.programs,
-            "acceptance_rate": uni.acceptance_rate,
-            "ielts_requirement": uni.ielts_requirement,
-            "gre_requirement": uni.gre_requirement,
-            "toefl_requirement": uni.toefl_requirement,
-            "application_deadline": uni.application_deadline,
-            "image_url": uni.image_url,
-            "description": uni.description,
-            "fit_score": fit_score,
-            "category": category,
-            "risk_level": risk
-        }
-        result.append(uni_dict)
+    ctx = _build_profile_context(profile)
+    result = [_university_response(uni, calculate_fit_score(uni, ctx)) for uni in universities]
     
     # Sort by fit score
-    result.sort(key=lambda x: x["fit_score"], reverse=True)
+    result.sort(key=lambda x: x.fit_score, reverse=True)
     
     return result
 
 
+@router.get("/stream")
+async def stream_universities(
+    country: Optional[str] = Query(None),
+    budget_max: Optional[int] = Query(None),
+    program: Optional[str] = Query(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream every matching university as NDJSON, scored one row at a time"""
+    universities = _filter_catalog(await university_catalog.all(db), country, budget_max, program)
+    ctx = _build_profile_context(await fetch_profile(db, current_user.id))
+    
+    # Rows are encoded as they are scored (id order), so nothing is buffered
+    async def generate():
+        for uni in universities:
+            yield _university_response(uni, calculate_fit_score(uni, ctx)).model_dump_json().encode() + b"\n"
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+
 @router.get("/recommendations", response_model=List[UniversityResponse])
 async def get_recommendations(
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get AI-recommended universities based on user profile"""
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
+    cached = _recommendations_cache.get(current_user.id, {}).get((limit, offset))
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
+    profile = await fetch_profile(db, current_user.id)
     
     if not profile:
         raise HTTPException(
@@ -168,76 +242,57 @@ async def get_recommendations(
         )
     
     # Get universities matching user preferences
-    query = db.query(University)
+    universities = await university_catalog.all(db)
     
     # Filter by budget if set
     if profile.budget_max:
-        query = query.filter(University.tuition_max <= profile.budget_max * 1.2)  # 20% buffer
+        max_tuition = profile.budget_max * 1.2  # 20% buffer
+        universities = [u for u in universities if u.tuition_max is not None and u.tuition_max <= max_tuition]
     
     # Filter by preferred countries
     if profile.preferred_countries:
-        try:
-            countries = json.loads(profile.preferred_countries)
-            if countries:
-                query = query.filter(University.country.in_(countries))
-        except:
-            pass
+        countries = set(profile.preferred_countries)
+        universities = [u for u in universities if u.country in countries]
     
-    universities = query.all()
+    universities = universities[offset:offset + limit]
     
     # Calculate fit and categorize
-    result = []
-    for uni in universities:
-        fit_score, category, risk = calculate_fit_score(uni, profile)
-        uni_dict = {
-            "id": uni.id,
-            "name": uni.name,
-            "country": uni.country,
-            "city": uni.city,
-            "ranking": uni.ranking,
-            "tuition_min": uni.tuition_min,
-            "tuition_max": uni.tuition_max,
-            "programs": uni.programs,
-            "acceptance_rate": uni.acceptance_rate,
-            "ielts_requirement": uni.ielts_requirement,
-            "gre_requirement": uni.gre_requirement,
-            "toefl_requirement": uni.toefl_requirement,
-            "application_deadline": uni.application_deadline,
-            "image_url": uni.image_url,
-            "description": uni.description,
-            "fit_score": fit_score,
-            "category": category,
-            "risk_level": risk
-        }
-        result.append(uni_dict)
+    ctx = _build_profile_context(profile)
+    result = [_university_response(uni, calculate_fit_score(uni, ctx)) for uni in universities]
     
-    result.sort(key=lambda x: x["fit_score"], reverse=True)
+    result.sort(key=lambda x: x.fit_score, reverse=True)
     
-    return result
+    # Cache the encoded body so warm hits skip validation and serialization too
+    body = _UNIVERSITY_LIST.dump_json(result)
+    _recommendations_cache.setdefault(current_user.id, {})[(limit, offset)] = body
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/shortlist", response_model=List[ShortlistedUniversityResponse])
 async def get_shortlist(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get user's shortlisted universities"""
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id
-    ).all()
+    # Only the shortlist columns come from the database; universities come
+    # from the in-process catalog
+    rows = (await db.execute(
+        select(
+            ShortlistedUniversity.id,
+            ShortlistedUniversity.university_id,
+            ShortlistedUniversity.category,
+            ShortlistedUniversity.is_locked,
+            ShortlistedUniversity.locked_at,
+            ShortlistedUniversity.notes
+        ).where(ShortlistedUniversity.user_id == current_user.id)
+    )).all()
     
     result = []
-    for s in shortlisted:
-        university = db.query(University).filter(University.id == s.university_id).first()
-        result.append({
-            "id": s.id,
-            "university_id": s.university_id,
-            "category": s.category,
-            "is_locked": s.is_locked,
-            "locked_at": s.locked_at,
-            "notes": s.notes,
-            "university": university
-        })
+    for row in rows:
+        university = await university_catalog.get(db, row.university_id)
+        if university is None:
+            continue
+        result.append({**row._mapping, "university": university})
     
     return result
 
@@ -246,47 +301,45 @@ async def get_shortlist(
 async def add_to_shortlist(
     shortlist_data: ShortlistCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Add a university to shortlist"""
     # Check if university exists
-    university = db.query(University).filter(University.id == shortlist_data.university_id).first()
+    university = await university_catalog.get(db, shortlist_data.university_id)
     if not university:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="University not found"
         )
     
-    # Check if already shortlisted
-    existing = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id,
-        ShortlistedUniversity.university_id == shortlist_data.university_id
-    ).first()
+    # Calculate category if not provided
+    profile = await fetch_profile(db, current_user.id)
+    _, category, _ = calculate_fit_score(university, _build_profile_context(profile))
+    
+    # Race-free insert: the unique (user_id, university_id) index decides
+    shortlisted = (await db.execute(
+        dialect_insert(ShortlistedUniversity)
+        .values(
+            user_id=current_user.id,
+            university_id=shortlist_data.university_id,
+            category=shortlist_data.category or category,
+            notes=shortlist_data.notes
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "university_id"])
+        .returning(ShortlistedUniversity)
+    )).scalar_one_or_none()
     
-    if existing:
+    if not shortlisted:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="University already in shortlist"
         )
     
-    # Calculate category if not provided
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    _, category, _ = calculate_fit_score(university, profile)
-    
-    shortlisted = ShortlistedUniversity(
-        user_id=current_user.id,
-        university_id=shortlist_data.university_id,
-        category=shortlist_data.category or category,
-        notes=shortlist_data.notes
-    )
-    db.add(shortlisted)
-    
     # Update user stage if first shortlist
     if current_user.current_stage < 3:
         current_user.current_stage = 3  # Stage 3: Finalizing Universities
     
-    db.commit()
-    db.refresh(shortlisted)
+    await db.commit()
     
     return {
         "id": shortlisted.id,
@@ -303,13 +356,16 @@ async def add_to_shortlist(
 async def remove_from_shortlist(
     university_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Remove a university from shortlist"""
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id,
-        ShortlistedUniversity.university_id == university_id
-    ).first()
+    result = await db.execute(
+        select(ShortlistedUniversity).where(
+            ShortlistedUniversity.user_id == current_user.id,
+            ShortlistedUniversity.university_id == university_id
+        )
+    )
+    shortlisted = result.scalars().first()
     
     if not shortlisted:
         raise HTTPException(
@@ -323,8 +379,8 @@ async def remove_from_shortlist(
             detail="Cannot remove a locked university. Unlock it first."
         )
     
-    db.delete(shortlisted)
-    db.commit()
+    await db.delete(shortlisted)
+    await db.commit()
     
     return {"message": "University removed from shortlist"}
 
@@ -332,14 +388,18 @@ async def remove_from_shortlist(
 @router.post("/lock")
 async def lock_university(
     lock_data: LockUniversityRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Lock a university (commitment step)"""
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id,
-        ShortlistedUniversity.university_id == lock_data.university_id
-    ).first()
+    result = await db.execute(
+        select(ShortlistedUniversity).where(
+            ShortlistedUniversity.user_id == current_user.id,
+            ShortlistedUniversity.university_id == lock_data.university_id
+        )
+    )
+    shortlisted = result.scalars().first()
     
     if not shortlisted:
         raise HTTPException(
@@ -353,17 +413,27 @@ async def lock_university(
             detail="University already locked"
         )
     
+    # Application tasks need the catalog entry; a stale shortlist row must not lock
+    university = await university_catalog.get(db, lock_data.university_id)
+    if not university:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="University not found"
+        )
+    
     shortlisted.is_locked = True
-    shortlisted.locked_at = datetime.utcnow()
+    shortlisted.locked_at = func.now()
     
     # Update user stage
-    current_user.current_stage = 4  # Stage 4: Preparing Applications
+    if current_user.current_stage != 4:
+        current_user.current_stage = 4  # Stage 4: Preparing Applications
     
-    # Create application tasks for this university
-    university = db.query(University).filter(University.id == lock_data.university_id).first()
-    create_application_tasks(db, current_user.id, university)
+    await db.commit()
     
-    db.commit()
+    # Application tasks land after the response; a failure there can't undo the lock
+    background_tasks.add_task(
+        _create_application_tasks_bg, current_user.id, lock_data.university_id, university
+    )
     
     return {
         "message": f"University locked successfully. Application guidance is now available.",
@@ -371,52 +441,62 @@ async def lock_university(
     }
 
 
-def create_application_tasks(db: Session, user_id: int, university: University):
+async def create_application_tasks(db: AsyncSession, user_id: int, university: CatalogUniversity):
     """Create application tasks for a locked university"""
+    # Core bulk INSERT skips @validates, so priority_rank is set explicitly
+    common = {
+        "user_id": user_id,
+        "university_id": university.id,
+        "priority": "high",
+        "priority_rank": int(Priority.HIGH)
+    }
     tasks_to_create = [
-        Task(
-            user_id=user_id,
-            university_id=university.id,
-            title=f"Complete SOP for {university.name}",
-            description="Write a tailored Statement of Purpose for this university",
-            category="document",
-            priority="high"
-        ),
-        Task(
-            user_id=user_id,
-            university_id=university.id,
-            title=f"Gather transcripts for {university.name}",
-            description="Request official transcripts from your institution",
-            category="document",
-            priority="high"
-        ),
-        Task(
-            user_id=user_id,
-            university_id=university.id,
-            title=f"Get recommendation letters for {university.name}",
-            description="Request 2-3 recommendation letters from professors/employers",
-            category="document",
-            priority="high"
-        ),
-        Task(
-            user_id=user_id,
-            university_id=university.id,
-            title=f"Submit application to {university.name}",
-            description="Complete and submit the online application",
-            category="application",
-            priority="high"
-        )
+        {
+            **common,
+            "title": f"Complete SOP for {university.name}",
+            "description": "Write a tailored Statement of Purpose for this university",
+            "category": "document"
+        },
+        {
+            **common,
+            "title": f"Gather transcripts for {university.name}",
+            "description": "Request official transcripts from your institution",
+            "category": "document"
+        },
+        {
+            **common,
+            "title": f"Get recommendation letters for {university.name}",
+            "description": "Request 2-3 recommendation letters from professors/employers",
+            "category": "document"
+        },
+        {
+            **common,
+            "title": f"Submit application to {university.name}",
+            "description": "Complete and submit the online application",
+            "category": "application"
+        }
     ]
     
-    for task in tasks_to_create:
-        db.add(task)
+    await db.execute(insert(Task), tasks_to_create)
+
+
+async def _create_application_tasks_bg(user_id: int, university_id: int, university: CatalogUniversity):
+    """Background job: create a locked university's tasks in a session of its own"""
+    async with AsyncSessionLocal() as db:
+        try:
+            await create_application_tasks(db, user_id, university)
+            await db.commit()
+        except Exception:
+            # Nobody awaits a background task, so keep the traceback in the log
+            logger.exception("Error creating application tasks for user %s, university %s", user_id, university_id)
+            await db.rollback()
 
 
 @router.post("/unlock")
 async def unlock_university(
     unlock_data: UnlockUniversityRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Unlock a university with confirmation"""
     if not unlock_data.confirm:
@@ -425,43 +505,58 @@ async def unlock_university(
             detail="Please confirm unlocking. This will remove associated tasks."
         )
     
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.user_id == current_user.id,
-        ShortlistedUniversity.university_id == unlock_data.university_id
-    ).first()
-    
-    if not shortlisted:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="University not in shortlist"
+    # Unlock only if currently locked; RETURNING tells us whether it was
+    unlocked = (await db.execute(
+        update(ShortlistedUniversity)
+        .where(
+            ShortlistedUniversity.user_id == current_user.id,
+            ShortlistedUniversity.university_id == unlock_data.university_id,
+            ShortlistedUniversity.is_locked == True
         )
-    
-    if not shortlisted.is_locked:
+        .values(is_locked=False, locked_at=None)
+        .returning(ShortlistedUniversity.id)
+        .execution_options(synchronize_session=False)
+    )).first()
+    
+    if not unlocked:
+        in_shortlist = (await db.execute(
+            select(ShortlistedUniversity.id).where(
+                ShortlistedUniversity.user_id == current_user.id,
+                ShortlistedUniversity.university_id == unlock_data.university_id
+            )
+        )).first()
+        if not in_shortlist:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="University not in shortlist"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="University is not locked"
         )
     
-    shortlisted.is_locked = False
-    shortlisted.locked_at = None
-    
     # Delete associated incomplete tasks
-    db.query(Task).filter(
-        Task.university_id == unlock_data.university_id,
-        Task.user_id == current_user.id,
-        Task.is_completed == False
-    ).delete()
-    
-    # Check if user still has locked universities
-    locked_count = db.query(ShortlistedUniversity).filter(
+    await db.execute(
+        delete(Task).where(
+            Task.university_id == unlock_data.university_id,
+            Task.user_id == current_user.id,
+            Task.is_completed == False
+        )
+    )
+    
+    # Back to Stage 3 when no locked universities remain, decided in the UPDATE
+    still_locked = exists().where(
         ShortlistedUniversity.user_id == current_user.id,
         ShortlistedUniversity.is_locked == True
-    ).count()
-    
-    if locked_count == 0:
-        current_user.current_stage = 3  # Back to Stage 3
+    )
+    await db.execute(
+        update(User)
+        .where(User.id == current_user.id)
+        .values(current_stage=case((~still_locked, 3), else_=User.current_stage))
+    )
     
-    db.commit()
+    await db.commit()
+    evict_cached_user(current_user.id)
     
     return {
         "message": "University unlocked. Associated incomplete tasks have been removed.",
@@ -474,13 +569,16 @@ async def update_application_status(
     id: int,
     status_update: UpdateApplicationStatus,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update application status for a shortlisted university"""
-    shortlisted = db.query(ShortlistedUniversity).filter(
-        ShortlistedUniversity.id == id,
-        ShortlistedUniversity.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(ShortlistedUniversity).where(
+            ShortlistedUniversity.id == id,
+            ShortlistedUniversity.user_id == current_user.id
+        )
+    )
+    shortlisted = result.scalar_one_or_none()
     
     if not shortlisted:
         raise HTTPException(
@@ -489,7 +587,7 @@ async def update_application_status(
         )
         
     shortlisted.application_status = status_update.status
-    db.commit()
+    await db.commit()
     
     return {"message": "Application status updated", "status": shortlisted.application_status}
 
@@ -498,10 +596,10 @@ async def update_application_status(
 async def get_university(
     university_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get a specific university by ID"""
-    university = db.query(University).filter(University.id == university_id).first()
+    university = await university_catalog.get(db, university_id)
     
     if not university:
         raise HTTPException(
@@ -509,26 +607,5 @@ async def get_university(
             detail="University not found"
         )
     
-    profile = db.query(Profile).filter(Profile.user_id == current_user.id).first()
-    fit_score, category, risk = calculate_fit_score(university, profile)
-    
-    return {
-        "id": university.id,
-        "name": university.name,
-        "country": university.country,
-        "city": university.city,
-        "ranking": university.ranking,
-        "tuition_min": university.tuition_min,
-        "tuition_max": university.tuition_max,
-        "programs": university.programs,
-        "acceptance_rate": university.acceptance_rate,
-        "ielts_requirement": university.ielts_requirement,
-        "gre_requirement": university.gre_requirement,
-        "toefl_requirement": university.toefl_requirement,
-        "application_deadline": university.application_deadline,
-        "image_url": university.image_url,
-        "description": university.description,
-        "fit_score": fit_score,
-        "category": category,
-        "risk_level": risk
-    }
+    profile = await fetch_profile(db, current_user.id)
+    return _university_response(university, calculate_fit_score(university, _build_profile_context(profile)))
@@ -2,10 +2,12 @@
 Pydantic Schemas
 Request/Response models for API validation
 """
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, field_validator
 from typing import Optional, List
 from datetime import datetime, date
 
+from models import parse_string_list
+
 
 # ============ Auth Schemas ============
 class UserCreate(BaseModel):
@@ -50,7 +52,7 @@ class ProfileBase(BaseModel):
     intended_degree: Optional[str] = None
     field_of_study: Optional[str] = None
     target_intake: Optional[str] = None
-    preferred_countries: Optional[str] = None  # JSON string
+    preferred_countries: Optional[List[str]] = None
     
     # Budget
     budget_min: Optional[int] = None
@@ -67,6 +69,14 @@ class ProfileBase(BaseModel):
     gmat_status: Optional[str] = None
     gmat_score: Optional[int] = None
     sop_status: Optional[str] = None
+    
+    @field_validator("preferred_countries", mode="before")
+    @classmethod
+    def _parse_preferred_countries(cls, value):
+        # Older clients send the list as a JSON or comma-separated string
+        if isinstance(value, str):
+            return parse_string_list(value)
+        return value
 
 
 class ProfileCreate(ProfileBase):
@@ -99,7 +109,7 @@ class UniversityBase(BaseModel):
     ranking: Optional[int] = None
     tuition_min: Optional[int] = None
     tuition_max: Optional[int] = None
-    programs: Optional[str] = None
+    programs: Optional[List[str]] = None
     acceptance_rate: Optional[float] = None
     ielts_requirement: Optional[float] = None
     gre_requirement: Optional[int] = None
@@ -194,6 +204,16 @@ class ChatResponse(BaseModel):
     suggestions: Optional[List[str]] = None
 
 
+class ConversationMessage(BaseModel):
+    id: int
+    role: str
+    message: str
+    created_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
 class VoiceOnboardingMessage(BaseModel):
     transcript: str
     current_step: Optional[str] = None
@@ -249,5 +269,22 @@ class DocumentResponse(DocumentBase):
         from_attributes = True
 
 
+class DocumentUploadUrlRequest(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+
+
+class DocumentUploadUrlResponse(BaseModel):
+    url: str
+    fields: dict
+    key: str
+
+
+class DocumentUploadComplete(BaseModel):
+    key: str
+    name: str
+    category: Optional[str] = "academic"
+
+
 class UpdateApplicationStatus(BaseModel):
     status: str
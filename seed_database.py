@@ -2,9 +2,10 @@
 Database Seed Script
 Populate database with sample university data
 """
-from database import SessionLocal, engine, Base
+from sqlalchemy import select, func, insert
+from database import AsyncSessionLocal, engine, Base
 from models import University
-import json
+import asyncio
 
 # Sample university data
 UNIVERSITIES = [
@@ -15,7 +16,7 @@ UNIVERSITIES = [
         "ranking": 1,
         "tuition_min": 53000,
         "tuition_max": 58000,
-        "programs": json.dumps(["Computer Science", "Engineering", "Business", "Physics", "Mathematics"]),
+        "programs": ["Computer Science", "Engineering", "Business", "Physics", "Mathematics"],
         "acceptance_rate": 4.0,
         "ielts_requirement": 7.0,
         "gre_requirement": 330,
@@ -31,7 +32,7 @@ UNIVERSITIES = [
         "ranking": 3,
         "tuition_min": 54000,
         "tuition_max": 60000,
-        "programs": json.dumps(["Computer Science", "Business", "Law", "Medicine", "Engineering"]),
+        "programs": ["Computer Science", "Business", "Law", "Medicine", "Engineering"],
         "acceptance_rate": 4.3,
         "ielts_requirement": 7.0,
         "gre_requirement": 330,
@@ -47,7 +48,7 @@ UNIVERSITIES = [
         "ranking": 15,
         "tuition_min": 43000,
         "tuition_max": 48000,
-        "programs": json.dumps(["Computer Science", "Engineering", "Business", "Data Science", "Public Policy"]),
+        "programs": ["Computer Science", "Engineering", "Business", "Data Science", "Public Policy"],
         "acceptance_rate": 17.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 320,
@@ -63,7 +64,7 @@ UNIVERSITIES = [
         "ranking": 25,
         "tuition_min": 32000,
         "tuition_max": 40000,
-        "programs": json.dumps(["Computer Science", "Engineering", "Business", "Life Sciences", "Arts"]),
+        "programs": ["Computer Science", "Engineering", "Business", "Life Sciences", "Arts"],
         "acceptance_rate": 43.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 310,
@@ -79,7 +80,7 @@ UNIVERSITIES = [
         "ranking": 50,
         "tuition_min": 500,
         "tuition_max": 2000,
-        "programs": json.dumps(["Engineering", "Computer Science", "Natural Sciences", "Management"]),
+        "programs": ["Engineering", "Computer Science", "Natural Sciences", "Management"],
         "acceptance_rate": 35.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 310,
@@ -95,7 +96,7 @@ UNIVERSITIES = [
         "ranking": 6,
         "tuition_min": 35000,
         "tuition_max": 45000,
-        "programs": json.dumps(["Engineering", "Medicine", "Science", "Business", "Computing"]),
+        "programs": ["Engineering", "Medicine", "Science", "Business", "Computing"],
         "acceptance_rate": 14.0,
         "ielts_requirement": 7.0,
         "gre_requirement": 320,
@@ -111,7 +112,7 @@ UNIVERSITIES = [
         "ranking": 8,
         "tuition_min": 1000,
         "tuition_max": 2000,
-        "programs": json.dumps(["Engineering", "Computer Science", "Natural Sciences", "Architecture"]),
+        "programs": ["Engineering", "Computer Science", "Natural Sciences", "Architecture"],
         "acceptance_rate": 27.0,
         "ielts_requirement": 7.0,
         "gre_requirement": 320,
@@ -127,7 +128,7 @@ UNIVERSITIES = [
         "ranking": 11,
         "tuition_min": 18000,
         "tuition_max": 25000,
-        "programs": json.dumps(["Computing", "Business", "Engineering", "Law", "Medicine"]),
+        "programs": ["Computing", "Business", "Engineering", "Law", "Medicine"],
         "acceptance_rate": 28.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 315,
@@ -143,7 +144,7 @@ UNIVERSITIES = [
         "ranking": 33,
         "tuition_min": 35000,
         "tuition_max": 45000,
-        "programs": json.dumps(["Business", "Engineering", "Arts", "Science", "Medicine"]),
+        "programs": ["Business", "Engineering", "Arts", "Science", "Medicine"],
         "acceptance_rate": 45.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 300,
@@ -159,7 +160,7 @@ UNIVERSITIES = [
         "ranking": 35,
         "tuition_min": 28000,
         "tuition_max": 38000,
-        "programs": json.dumps(["Computer Science", "Engineering", "Business", "Forestry", "Sciences"]),
+        "programs": ["Computer Science", "Engineering", "Business", "Forestry", "Sciences"],
         "acceptance_rate": 52.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 300,
@@ -175,7 +176,7 @@ UNIVERSITIES = [
         "ranking": 45,
         "tuition_min": 33000,
         "tuition_max": 38000,
-        "programs": json.dumps(["Computer Science", "Engineering", "Business", "Sciences"]),
+        "programs": ["Computer Science", "Engineering", "Business", "Sciences"],
         "acceptance_rate": 21.0,
         "ielts_requirement": 7.0,
         "gre_requirement": 320,
@@ -191,7 +192,7 @@ UNIVERSITIES = [
         "ranking": 40,
         "tuition_min": 38000,
         "tuition_max": 42000,
-        "programs": json.dumps(["Computer Science", "Engineering", "Business", "Law", "Liberal Arts"]),
+        "programs": ["Computer Science", "Engineering", "Business", "Law", "Liberal Arts"],
         "acceptance_rate": 32.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 315,
@@ -207,7 +208,7 @@ UNIVERSITIES = [
         "ranking": 112,
         "tuition_min": 25000,
         "tuition_max": 35000,
-        "programs": json.dumps(["Computer Science", "Engineering", "Mathematics", "Co-op Programs"]),
+        "programs": ["Computer Science", "Engineering", "Mathematics", "Co-op Programs"],
         "acceptance_rate": 55.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 300,
@@ -223,7 +224,7 @@ UNIVERSITIES = [
         "ranking": 185,
         "tuition_min": 28000,
         "tuition_max": 32000,
-        "programs": json.dumps(["Engineering", "Business", "Computer Science", "Design", "Journalism"]),
+        "programs": ["Engineering", "Business", "Computer Science", "Design", "Journalism"],
         "acceptance_rate": 88.0,
         "ielts_requirement": 6.0,
         "gre_requirement": 290,
@@ -239,7 +240,7 @@ UNIVERSITIES = [
         "ranking": 90,
         "tuition_min": 300,
         "tuition_max": 1000,
-        "programs": json.dumps(["Engineering", "Computer Science", "Natural Sciences", "Medicine"]),
+        "programs": ["Engineering", "Computer Science", "Natural Sciences", "Medicine"],
         "acceptance_rate": 40.0,
         "ielts_requirement": 6.5,
         "gre_requirement": 300,
@@ -251,34 +252,33 @@ UNIVERSITIES = [
 ]
 
 
-def seed_database():
+async def seed_database():
     """Seed database with sample data"""
     # Create tables
-    Base.metadata.create_all(bind=engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
     
-    db = SessionLocal()
+    db = AsyncSessionLocal()
     
     try:
         # Check if universities already exist
-        existing = db.query(University).count()
+        existing = (await db.execute(select(func.count()).select_from(University))).scalar_one()
         if existing > 0:
             print(f"Database already has {existing} universities. Skipping seed.")
             return
         
-        # Add universities
-        for uni_data in UNIVERSITIES:
-            university = University(**uni_data)
-            db.add(university)
-        
-        db.commit()
+        # Add universities as one bulk INSERT, without building ORM objects
+        await db.execute(insert(University), UNIVERSITIES)
+        await db.commit()
         print(f"✅ Successfully seeded {len(UNIVERSITIES)} universities!")
         
     except Exception as e:
         print(f"❌ Error seeding database: {e}")
-        db.rollback()
+        await db.rollback()
     finally:
-        db.close()
+        await db.close()
+        await engine.dispose()
 
 
 if __name__ == "__main__":
-    seed_database()
+    asyncio.run(seed_database())
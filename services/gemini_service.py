@@ -3,43 +3,36 @@ Gemini AI Service
 Integration with Google Gemini for AI counselling and voice onboarding
 """
 import os
-import json
+import re
+import hashlib
+import asyncio
+import logging
+from functools import lru_cache
 from typing import Optional
+import orjson
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
+from fastapi import Request
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Try to import Gemini SDK
 try:
     from google import genai
+    from google.genai import types as genai_types
     GEMINI_AVAILABLE = True
 except ImportError:
     print("Warning: google-genai package not found. AI features will use fallback responses.")
     GEMINI_AVAILABLE = False
 
 
-class GeminiService:
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        self.client = None
-        self.model_name = 'gemini-1.5-flash'
-        
-        if GEMINI_AVAILABLE and self.api_key and self.api_key != "your-gemini-api-key-here":
-            self.client = genai.Client(api_key=self.api_key)
-    
-    def _get_counsellor_system_prompt(self, context: dict) -> str:
-        """Generate system prompt with user context"""
-        return f"""You are an expert study-abroad AI counsellor. Your name is "AI Counsellor".
+# Counsellor instructions shared by every user; kept first so Gemini can cache them
+STATIC_PROMPT = """You are an expert study-abroad AI counsellor. Your name is "AI Counsellor".
 You help students make informed decisions about studying abroad.
 
-CURRENT USER CONTEXT:
-- Name: {context.get('user_name', 'Student')}
-- Current Stage: {self._get_stage_name(context.get('current_stage', 1))}
-- Profile: {json.dumps(context.get('profile', {}), indent=2)}
-- Shortlisted Universities: {json.dumps(context.get('shortlisted_universities', []), indent=2)}
-- Locked Universities: {json.dumps(context.get('locked_universities', []), indent=2)}
-- Pending Tasks: {json.dumps(context.get('pending_tasks', []), indent=2)}
-
 YOUR ROLE:
 1. Analyze the student's profile - highlight STRENGTHS and GAPS
 2. Recommend universities categorized as:
@@ -90,15 +83,257 @@ IMPORTANT:
 - Guide them through the process step by step
 - Don't overwhelm with too much information at once
 """
+
+# Voice onboarding instructions; the per-turn step, profile and transcript follow them
+STATIC_VOICE_PROMPT = """You are an AI assistant helping with voice-based onboarding for a study abroad platform.
+
+Your tasks:
+1. Extract any relevant profile information from what the user said (given at the end)
+2. Generate a friendly spoken response
+3. Determine the next step
+
+ONBOARDING STEPS:
+1. education_level - Ask about current education (high school, bachelor's, master's)
+2. degree_major - Ask about their degree and major
+3. graduation_year - Ask when they graduate/graduated
+4. gpa - Ask about their GPA (optional)
+5. intended_degree - What degree they want to pursue abroad
+6. field_of_study - What field they want to study
+7. preferred_countries - Which countries interest them
+8. target_intake - When do they want to start (Fall 2025, Spring 2026, etc.)
+9. budget - Their budget range per year
+10. exams - IELTS/TOEFL/GRE status
+11. complete - Summary and completion
+
+Respond in this JSON format:
+{
+    "response_text": "Your spoken response to the user",
+    "next_step": "The next step to ask about",
+    "extracted_data": {
+        "field_name": "extracted_value"
+    },
+    "is_complete": false
+}
+
+Extract data that matches these fields:
+- education_level, degree, major, graduation_year, gpa
+- intended_degree, field_of_study, target_intake, preferred_countries (as a JSON array of country names)
+- budget_min, budget_max, funding_type
+- ielts_status, ielts_score, gre_status, gre_score, sop_status
+"""
+
+GEMINI_TIMEOUT_MS = 30_000
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "500"))
+
+# Module-level so the limits hold across every GeminiService instance
+_generate_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+_generate_rate_limiter = AsyncLimiter(GEMINI_REQUESTS_PER_MINUTE, 60)
+
+BATCH_POLL_INITIAL_SECONDS = 5
+BATCH_POLL_MAX_SECONDS = 300
+BATCH_DONE_STATES = frozenset({
+    "JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED", "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"
+})
+
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL_SECONDS = 300
+
+# Conversation history window: older turns are folded into a rolling summary
+HISTORY_RAW_TURNS = 4
+HISTORY_SUMMARY_THRESHOLD_TOKENS = 1500
+HISTORY_SUMMARY_MAX_TOKENS = 512
+
+# Markdown code fence around a JSON reply
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+
+# Fallback chat: keyword -> topic, matched in a single scan
+_FALLBACK_TOPICS = {
+    'hello': 'greeting', 'hi': 'greeting',
+    'universit': 'universities', 'recommend': 'universities', 'apply': 'universities',
+    'profile': 'profile', 'strength': 'profile', 'analyz': 'profile',
+    'next': 'next_steps', 'should': 'next_steps', 'step': 'next_steps',
+    'shortlist': 'shortlist', 'add': 'shortlist'
+}
+_FALLBACK_RE = re.compile(r"\b(?:hello|hi)\b|universit|recommend|apply|profile|strength|analyz|next|should|step|shortlist|add")
+
+# Voice fallback: spoken country name -> stored value
+_COUNTRY_ALIASES = {
+    'usa': 'USA', 'america': 'USA', 'united states': 'USA',
+    'canada': 'Canada',
+    'uk': 'UK', 'britain': 'UK', 'england': 'UK',
+    'germany': 'Germany',
+    'australia': 'Australia'
+}
+_COUNTRY_ORDER = ('USA', 'Canada', 'UK', 'Germany', 'Australia')
+_COUNTRY_RE = re.compile("|".join(sorted(map(re.escape, _COUNTRY_ALIASES), key=len, reverse=True)))
+
+# Prompt speaker labels; anything else is the counsellor
+_ROLE_LABELS = {'user': 'User'}
+
+# Voice fallback extractors
+_YEAR_RE = re.compile(r'20\d{2}')
+_NUMBER_RE = re.compile(r'\d+')
+_SCORE_RE = re.compile(r'(\d\.?\d?)')
+
+_STAGE_NAMES = (
+    "Unknown",
+    "Building Profile",
+    "Discovering Universities",
+    "Finalizing Universities",
+    "Preparing Applications"
+)
+
+
+def _compact_json(value) -> str:
+    """JSON without pretty-printing whitespace, which only costs prompt tokens"""
+    return orjson.dumps(value).decode()
+
+
+# Fallback next-step advice; stage 4 adds exam/SOP reminders per profile
+_STAGE_ADVICE = {
+    1: """**Stage 1: Complete Your Profile**
+- Fill in your academic background
+- Set your study goals and preferences  
+- Define your budget range
+- Update exam readiness status""",
+    2: """**Stage 2: Discover Universities**
+- Browse universities matching your profile
+- Consider Dream, Target, and Safe options
+- Research program details and requirements
+- Start shortlisting potential matches""",
+    3: """**Stage 3: Finalize Your List**
+- Review your shortlisted universities
+- Compare costs, deadlines, and requirements
+- Lock at least one university to proceed
+- This commits you to the application stage"""
+}
+_STAGE_4_STEPS = """- Gather official transcripts
+- Request recommendation letters
+- Prepare application documents
+- Submit applications before deadlines"""
+
+
+@lru_cache(maxsize=256)
+def _format_user_context(
+    user_name: str,
+    stage_name: str,
+    profile_json: str,
+    shortlist_json: str,
+    locked_json: str,
+    tasks_json: str
+) -> str:
+    """CURRENT USER CONTEXT block; repeat turns with unchanged context hit the cache"""
+    return f"""CURRENT USER CONTEXT:
+- Name: {user_name}
+- Current Stage: {stage_name}
+- Profile: {profile_json}
+- Shortlisted Universities: {shortlist_json}
+- Locked Universities: {locked_json}
+- Pending Tasks: {tasks_json}
+"""
+
+
+class GeminiService:
+    def __init__(self):
+        self.api_key = os.getenv("GEMINI_API_KEY")
+        self.client = None
+        self.model_name = 'gemini-1.5-flash'
+        self._response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL_SECONDS)
+        
+        if GEMINI_AVAILABLE and self.api_key and self.api_key != "your-gemini-api-key-here":
+            self.client = genai.Client(
+                api_key=self.api_key,
+                http_options={"timeout": GEMINI_TIMEOUT_MS}
+            )
+    
+    async def aclose(self) -> None:
+        """Release the shared client's HTTP connections (app shutdown)"""
+        if self.client:
+            await self.client.aio.aclose()
+            self.client.close()
+    
+    def _get_user_context_prompt(self, context: dict) -> str:
+        """Per-user context block, sent after the static prompt"""
+        return _format_user_context(
+            context.get('user_name', 'Student'),
+            self._get_stage_name(context.get('current_stage', 1)),
+            _compact_json(context.get('profile', {})),
+            _compact_json(context.get('shortlisted_universities', [])),
+            _compact_json(context.get('locked_universities', [])),
+            _compact_json(context.get('pending_tasks', []))
+        )
     
     def _get_stage_name(self, stage: int) -> str:
-        stages = {
-            1: "Building Profile",
-            2: "Discovering Universities", 
-            3: "Finalizing Universities",
-            4: "Preparing Applications"
+        if 0 < (stage or 0) < len(_STAGE_NAMES):
+            return _STAGE_NAMES[stage]
+        return _STAGE_NAMES[0]
+    
+    async def _generate(self, contents: str, config=None):
+        """generate_content within the process-wide concurrency and QPM limits"""
+        async with _generate_rate_limiter, _generate_semaphore:
+            return await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=contents,
+                config=config
+            )
+    
+    async def _generate_with_static_prompt(self, contents: str):
+        """generate_content with STATIC_PROMPT as the system instruction"""
+        # STATIC_PROMPT is below the explicit-cache minimum; as an identical leading
+        # prefix it is picked up by Gemini's implicit caching instead
+        return await self._generate(
+            contents,
+            genai_types.GenerateContentConfig(system_instruction=STATIC_PROMPT)
+        )
+    
+    async def _generate_stream(self, contents: str, config):
+        """generate_content_stream chunks; the limits are held until the stream ends"""
+        async with _generate_rate_limiter, _generate_semaphore:
+            stream = await self.client.aio.models.generate_content_stream(
+                model=self.model_name,
+                contents=contents,
+                config=config
+            )
+            async for chunk in stream:
+                yield chunk
+    
+    async def _stream_with_static_prompt(self, contents: str):
+        """Streaming counterpart of _generate_with_static_prompt"""
+        async for chunk in self._generate_stream(
+            contents,
+            genai_types.GenerateContentConfig(system_instruction=STATIC_PROMPT)
+        ):
+            yield chunk
+    
+    def _response_cache_key(self, message: str, context: dict, user_context: str) -> bytes:
+        # Everything the prompt carries: follow-ups like "yes" only match the same conversation
+        key = hashlib.blake2b(user_context.encode(), digest_size=16)
+        key.update(b"\0" + (context.get('conversation_summary') or '').encode())
+        for line in self._history_lines(context.get('conversation_history', [])):
+            key.update(line.encode())
+        key.update(b"\0" + message.strip().lower().encode())
+        return key.digest()
+    
+    def _build_chat_prompt(self, message: str, context: dict, user_context: str) -> str:
+        # Most stable first so Gemini's prefix cache keeps hitting across turns:
+        # STATIC_PROMPT (system instruction) > user context > summary > history > new turn
+        parts = [user_context]
+        summary = context.get('conversation_summary')
+        if summary:
+            parts.append(f"\nEARLIER CONVERSATION (SUMMARY):\n{summary}\n")
+        parts.append("\nCONVERSATION:\n")
+        parts.extend(self._history_lines(context.get('conversation_history', [])))
+        parts.append(f"User: {message}\nCounsellor:")
+        return "".join(parts)
+    
+    def _reply(self, response_text: str, context: dict) -> dict:
+        return {
+            "message": response_text,
+            "actions": self._extract_actions(response_text),
+            "suggestions": self._generate_suggestions(context)
         }
-        return stages.get(stage, "Unknown")
     
     async def get_counsellor_response(self, message: str, context: dict) -> dict:
         """Get AI counsellor response"""
@@ -106,53 +341,106 @@ IMPORTANT:
             # Fallback response when Gemini not available
             return self._get_fallback_response(message, context)
         
+        # Same question against an unchanged context (profile, shortlist, tasks, stage, history): reuse the answer
+        user_context = self._get_user_context_prompt(context)
+        cache_key = self._response_cache_key(message, context, user_context)
+        cached = self._response_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+        
         try:
-            system_prompt = self._get_counsellor_system_prompt(context)
-            
-            # Build conversation with history
-            history = context.get('conversation_history', [])
-            conversation_text = system_prompt + "\n\nCONVERSATION:\n"
-            for msg in history[-6:]:  # Last 6 messages for context
-                role = "User" if msg['role'] == 'user' else "Counsellor"
-                conversation_text += f"{role}: {msg['content']}\n"
-            
-            conversation_text += f"User: {message}\nCounsellor:"
-            
-            response = await self.client.aio.models.generate_content(
-                model=self.model_name,
-                contents=conversation_text
+            response = await self._generate_with_static_prompt(
+                self._build_chat_prompt(message, context, user_context)
             )
             
             # Parse response for actions
-            response_text = response.text
-            actions = self._extract_actions(response_text)
-            suggestions = self._generate_suggestions(context)
-            
-            return {
-                "message": response_text,
-                "actions": actions,
-                "suggestions": suggestions
-            }
-        except Exception as e:
-            print(f"Gemini error: {e}")
+            result = self._reply(response.text, context)
+            self._response_cache[cache_key] = result
+            return dict(result)
+        except Exception:
+            logger.exception("Gemini error")
             return self._get_fallback_response(message, context)
     
+    async def stream_counsellor_response(self, message: str, context: dict):
+        """Counsellor reply as {"delta": text} events, then {"done": True, ...reply}"""
+        reply = None
+        streamed = False
+        
+        if self.client:
+            user_context = self._get_user_context_prompt(context)
+            cache_key = self._response_cache_key(message, context, user_context)
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                reply = dict(cached)
+            else:
+                chunks = []
+                try:
+                    async for chunk in self._stream_with_static_prompt(
+                        self._build_chat_prompt(message, context, user_context)
+                    ):
+                        if chunk.text:
+                            chunks.append(chunk.text)
+                            streamed = True
+                            yield {"delta": chunk.text}
+                    result = self._reply("".join(chunks), context)
+                    self._response_cache[cache_key] = result
+                    reply = dict(result)
+                except Exception:
+                    logger.exception("Gemini stream error")
+                    # Keep whatever already reached the client; don't cache a cut-off reply
+                    if chunks:
+                        reply = self._reply("".join(chunks), context)
+        
+        if reply is None:
+            reply = self._get_fallback_response(message, context)
+        if not streamed:
+            yield {"delta": reply["message"]}
+        yield {"done": True, **reply}
+    
+    def _history_lines(self, history: list):
+        return (f"{_ROLE_LABELS.get(msg['role'], 'Counsellor')}: {msg['content']}\n" for msg in history)
+    
+    def needs_history_summary(self, history: list) -> bool:
+        """Whether the unsummarized turns exceed the prompt token budget (~4 chars per token)"""
+        if not self.client:
+            return False
+        return sum(len(msg['content']) for msg in history) // 4 > HISTORY_SUMMARY_THRESHOLD_TOKENS
+    
+    async def summarize_history(self, previous_summary: Optional[str], history: list) -> Optional[str]:
+        """Fold the previous summary and newer turns into one compact summary"""
+        prompt = f"""Compress this study-abroad counselling conversation into a short summary for the counsellor's memory.
+Keep the student's goals, preferences, decisions, open questions and any advice already given. Use at most 200 words.
+
+PREVIOUS SUMMARY:
+{previous_summary or 'None'}
+
+NEWER MESSAGES:
+{''.join(self._history_lines(history))}"""
+        try:
+            response = await self._generate(
+                prompt,
+                genai_types.GenerateContentConfig(max_output_tokens=HISTORY_SUMMARY_MAX_TOKENS)
+            )
+            return response.text.strip() or None
+        except Exception:
+            logger.exception("Gemini summary error")
+            return None
+    
     def _get_fallback_response(self, message: str, context: dict) -> dict:
         """Fallback responses when Gemini is not available"""
-        message_lower = message.lower()
+        topics = {_FALLBACK_TOPICS[keyword] for keyword in _FALLBACK_RE.findall(message.lower())}
         profile = context.get('profile', {})
         stage = context.get('current_stage', 1)
         
         # Context-aware fallback responses
-        if 'hello' in message_lower or 'hi' in message_lower:
+        if 'greeting' in topics:
             name = context.get('user_name', 'there')
             return {
                 "message": f"Hello {name}! 👋 I'm your AI Study Abroad Counsellor. I'm here to help you navigate your journey to studying abroad. Based on your profile, you're currently in the **{self._get_stage_name(stage)}** stage. How can I help you today?",
                 "suggestions": ["What universities should I apply to?", "Analyze my profile", "What should I do next?"]
             }
         
-        if 'universit' in message_lower or 'recommend' in message_lower or 'apply' in message_lower:
-            countries = profile.get('preferred_countries', '[]')
+        if 'universities' in topics:
             intended = profile.get('intended_degree', 'your degree')
             return {
                 "message": f"""Based on your profile, here are my recommendations for {intended} programs:
@@ -177,7 +465,7 @@ Would you like me to add any of these to your shortlist? Or would you like more
                 "suggestions": ["Tell me more about MIT", "Add University of Toronto to shortlist", "What are my chances?"]
             }
         
-        if 'profile' in message_lower or 'strength' in message_lower or 'analyz' in message_lower:
+        if 'profile' in topics:
             gpa = profile.get('gpa', 'not provided')
             ielts = profile.get('ielts_status', 'not started')
             sop = profile.get('sop_status', 'not started')
@@ -209,7 +497,7 @@ Would you like specific university recommendations?""",
                 "suggestions": ["Recommend universities", "What should I prepare next?", "Help me with SOP"]
             }
         
-        if 'next' in message_lower or 'should' in message_lower or 'step' in message_lower:
+        if 'next_steps' in topics:
             return {
                 "message": f"""Based on your current stage (**{self._get_stage_name(stage)}**), here's what you should focus on:
 
@@ -219,7 +507,7 @@ Would you like help with any of these?""",
                 "suggestions": ["Show my pending tasks", "Recommend universities", "Analyze my profile"]
             }
         
-        if 'shortlist' in message_lower or 'add' in message_lower:
+        if 'shortlist' in topics:
             return {
                 "message": "I can help you shortlist universities! Tell me which university you'd like to add, or ask me for recommendations based on your profile.",
                 "suggestions": ["Recommend universities for me", "Show my current shortlist", "What's the difference between Dream and Safe?"]
@@ -239,44 +527,18 @@ What would you like to explore? You're currently in the **{self._get_stage_name(
         }
     
     def _get_stage_advice(self, stage: int, profile: dict) -> str:
-        if stage == 1:
-            return """**Stage 1: Complete Your Profile**
-- Fill in your academic background
-- Set your study goals and preferences  
-- Define your budget range
-- Update exam readiness status"""
-        
-        elif stage == 2:
-            return """**Stage 2: Discover Universities**
-- Browse universities matching your profile
-- Consider Dream, Target, and Safe options
-- Research program details and requirements
-- Start shortlisting potential matches"""
-        
-        elif stage == 3:
-            return """**Stage 3: Finalize Your List**
-- Review your shortlisted universities
-- Compare costs, deadlines, and requirements
-- Lock at least one university to proceed
-- This commits you to the application stage"""
-        
-        elif stage == 4:
-            ielts = profile.get('ielts_status', 'not_started')
-            sop = profile.get('sop_status', 'not_started')
-            tasks = []
-            if ielts != 'completed':
-                tasks.append("- ⚠️ Complete IELTS/TOEFL exam")
-            if sop != 'ready':
-                tasks.append("- ⚠️ Finalize your Statement of Purpose")
-            tasks.extend([
-                "- Gather official transcripts",
-                "- Request recommendation letters",
-                "- Prepare application documents",
-                "- Submit applications before deadlines"
-            ])
-            return "**Stage 4: Application Preparation**\n" + "\n".join(tasks)
+        if stage != 4:
+            return _STAGE_ADVICE.get(stage, "Keep exploring and let me know how I can help!")
         
-        return "Keep exploring and let me know how I can help!"
+        ielts = profile.get('ielts_status', 'not_started')
+        sop = profile.get('sop_status', 'not_started')
+        lines = ["**Stage 4: Application Preparation**"]
+        if ielts != 'completed':
+            lines.append("- ⚠️ Complete IELTS/TOEFL exam")
+        if sop != 'ready':
+            lines.append("- ⚠️ Finalize your Statement of Purpose")
+        lines.append(_STAGE_4_STEPS)
+        return "\n".join(lines)
     
     def _extract_actions(self, response: str) -> list:
         """Extract actionable items from response"""
@@ -302,6 +564,26 @@ What would you like to explore? You're currently in the **{self._get_stage_name(
         
         return suggestions
     
+    def _build_voice_prompt(self, transcript: str, current_step: Optional[str], current_profile: dict) -> str:
+        # Per-turn details go last so the instructions stay an identical, cacheable prefix
+        return f"""{STATIC_VOICE_PROMPT}
+---
+Current onboarding step: {current_step or 'start'}
+Current profile data: {_compact_json(current_profile)}
+
+User said: "{transcript}"
+"""
+    
+    def _parse_voice_reply(self, response_text: str) -> Optional[dict]:
+        """JSON payload of a voice-onboarding reply, or None if it isn't valid JSON"""
+        fence = _FENCE_RE.search(response_text)
+        if fence:
+            response_text = fence.group(1)
+        try:
+            return orjson.loads(response_text.strip())
+        except orjson.JSONDecodeError:
+            return None
+    
     async def process_voice_onboarding(
         self, 
         transcript: str, 
@@ -314,71 +596,57 @@ What would you like to explore? You're currently in the **{self._get_stage_name(
             return self._process_voice_fallback(transcript, current_step, current_profile)
         
         try:
-            prompt = f"""You are an AI assistant helping with voice-based onboarding for a study abroad platform.
-
-Current onboarding step: {current_step or 'start'}
-Current profile data: {json.dumps(current_profile, indent=2)}
-
-User said: "{transcript}"
-
-Your tasks:
-1. Extract any relevant profile information from what the user said
-2. Generate a friendly spoken response
-3. Determine the next step
-
-ONBOARDING STEPS:
-1. education_level - Ask about current education (high school, bachelor's, master's)
-2. degree_major - Ask about their degree and major
-3. graduation_year - Ask when they graduate/graduated
-4. gpa - Ask about their GPA (optional)
-5. intended_degree - What degree they want to pursue abroad
-6. field_of_study - What field they want to study
-7. preferred_countries - Which countries interest them
-8. target_intake - When do they want to start (Fall 2025, Spring 2026, etc.)
-9. budget - Their budget range per year
-10. exams - IELTS/TOEFL/GRE status
-11. complete - Summary and completion
-
-Respond in this JSON format:
-{{
-    "response_text": "Your spoken response to the user",
-    "next_step": "The next step to ask about",
-    "extracted_data": {{
-        "field_name": "extracted_value"
-    }},
-    "is_complete": false
-}}
-
-Extract data that matches these fields:
-- education_level, degree, major, graduation_year, gpa
-- intended_degree, field_of_study, target_intake, preferred_countries (as JSON array string)
-- budget_min, budget_max, funding_type
-- ielts_status, ielts_score, gre_status, gre_score, sop_status
-"""
+            prompt = self._build_voice_prompt(transcript, current_step, current_profile)
+            response = await self._generate(prompt)
             
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=prompt
-            )
-            
-            # Parse JSON response
-            try:
-                # Try to extract JSON from response
-                response_text = response.text
-                if '```json' in response_text:
-                    response_text = response_text.split('```json')[1].split('```')[0]
-                elif '```' in response_text:
-                    response_text = response_text.split('```')[1].split('```')[0]
-                
-                result = json.loads(response_text)
-                return result
-            except json.JSONDecodeError:
+            result = self._parse_voice_reply(response.text)
+            if result is None:
                 return self._process_voice_fallback(transcript, current_step, current_profile)
+            return result
                 
-        except Exception as e:
-            print(f"Gemini voice error: {e}")
+        except Exception:
+            logger.exception("Gemini voice error")
             return self._process_voice_fallback(transcript, current_step, current_profile)
     
+    async def process_voice_batch(self, items: list, batch_name: Optional[str] = None) -> list:
+        """Non-interactive voice extraction via the Gemini Batch API (cheaper, not real-time)"""
+        if not self.client:
+            return [self._process_voice_fallback(**item) for item in items]
+        
+        # A batch_name from an earlier call resumes polling instead of resubmitting
+        if batch_name is None:
+            async with _generate_rate_limiter:
+                job = await self.client.aio.batches.create(
+                    model=self.model_name,
+                    src=[
+                        {"contents": [{"role": "user", "parts": [{"text": self._build_voice_prompt(**item)}]}]}
+                        for item in items
+                    ]
+                )
+            batch_name = job.name
+            logger.info("Submitted voice batch %s (%d items)", batch_name, len(items))
+        
+        # Poll with exponential backoff until the job leaves the queue
+        delay = BATCH_POLL_INITIAL_SECONDS
+        job = await self.client.aio.batches.get(name=batch_name)
+        while job.state.name not in BATCH_DONE_STATES:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, BATCH_POLL_MAX_SECONDS)
+            job = await self.client.aio.batches.get(name=batch_name)
+        
+        responses = job.dest.inlined_responses if job.dest and job.dest.inlined_responses else []
+        if job.state.name != "JOB_STATE_SUCCEEDED":
+            logger.warning("Voice batch %s finished as %s", batch_name, job.state.name)
+        
+        results = []
+        for i, item in enumerate(items):
+            inlined = responses[i] if i < len(responses) else None
+            result = None
+            if inlined is not None and inlined.response is not None and inlined.response.text:
+                result = self._parse_voice_reply(inlined.response.text)
+            results.append(result if result is not None else self._process_voice_fallback(**item))
+        return results
+    
     def _process_voice_fallback(
         self,
         transcript: str,
@@ -386,20 +654,6 @@ Extract data that matches these fields:
         current_profile: dict
     ) -> dict:
         """Fallback voice processing without AI"""
-        
-        transcript_lower = transcript.lower()
-        extracted = {}
-        
-        # Step flow
-        steps = [
-            'start', 'education_level', 'degree_major', 'graduation_year',
-            'intended_degree', 'field_of_study', 'preferred_countries',
-            'target_intake', 'budget', 'exams', 'complete'
-        ]
-        
-        current_idx = steps.index(current_step) if current_step in steps else 0
-        
-        # Simple extraction based on current step
         if current_step == 'start' or not current_step:
             return {
                 "response_text": "Hi! I'm your AI counsellor. Let's set up your profile together. What's your current education level? Are you in high school, doing a bachelor's, or have you completed a master's?",
@@ -408,159 +662,156 @@ Extract data that matches these fields:
                 "is_complete": False
             }
         
-        elif current_step == 'education_level':
-            if 'bachelor' in transcript_lower:
-                extracted['education_level'] = 'bachelors'
-            elif 'master' in transcript_lower:
-                extracted['education_level'] = 'masters'
-            elif 'high school' in transcript_lower or 'school' in transcript_lower:
-                extracted['education_level'] = 'high_school'
-            
-            return {
-                "response_text": "Great! What's your degree and major? For example, Bachelor's in Computer Science.",
-                "next_step": "degree_major",
-                "extracted_data": extracted,
-                "is_complete": False
-            }
-        
-        elif current_step == 'degree_major':
-            # Extract degree and major from transcript
-            if 'computer' in transcript_lower:
-                extracted['major'] = 'Computer Science'
-            elif 'business' in transcript_lower:
-                extracted['major'] = 'Business Administration'
-            elif 'engineer' in transcript_lower:
-                extracted['major'] = 'Engineering'
-            
-            return {
-                "response_text": "Good! What year are you graduating or did you graduate?",
-                "next_step": "graduation_year",
-                "extracted_data": extracted,
-                "is_complete": False
-            }
-        
-        elif current_step == 'graduation_year':
-            # Extract year
-            import re
-            years = re.findall(r'20\d{2}', transcript)
-            if years:
-                extracted['graduation_year'] = int(years[0])
-            
-            return {
-                "response_text": "Perfect! What degree are you planning to pursue abroad? Bachelor's, Master's, MBA, or PhD?",
-                "next_step": "intended_degree",
-                "extracted_data": extracted,
-                "is_complete": False
-            }
-        
-        elif current_step == 'intended_degree':
-            if 'master' in transcript_lower or 'ms' in transcript_lower:
-                extracted['intended_degree'] = 'masters'
-            elif 'mba' in transcript_lower:
-                extracted['intended_degree'] = 'mba'
-            elif 'phd' in transcript_lower or 'doctor' in transcript_lower:
-                extracted['intended_degree'] = 'phd'
-            elif 'bachelor' in transcript_lower:
-                extracted['intended_degree'] = 'bachelors'
-            
-            return {
-                "response_text": "What field would you like to study?",
-                "next_step": "field_of_study",
-                "extracted_data": extracted,
-                "is_complete": False
-            }
-        
-        elif current_step == 'field_of_study':
-            extracted['field_of_study'] = transcript.strip().title()
-            
+        step = _VOICE_FALLBACK_STEPS.get(current_step)
+        if step is None:
             return {
-                "response_text": "Which countries are you interested in? You can mention multiple, like USA, Canada, or UK.",
-                "next_step": "preferred_countries",
-                "extracted_data": extracted,
-                "is_complete": False
-            }
-        
-        elif current_step == 'preferred_countries':
-            countries = []
-            if 'usa' in transcript_lower or 'america' in transcript_lower or 'united states' in transcript_lower:
-                countries.append('USA')
-            if 'canada' in transcript_lower:
-                countries.append('Canada')
-            if 'uk' in transcript_lower or 'britain' in transcript_lower or 'england' in transcript_lower:
-                countries.append('UK')
-            if 'germany' in transcript_lower:
-                countries.append('Germany')
-            if 'australia' in transcript_lower:
-                countries.append('Australia')
-            
-            if countries:
-                extracted['preferred_countries'] = json.dumps(countries)
-            
-            return {
-                "response_text": "When do you want to start your studies? Fall 2025, Spring 2026, or later?",
-                "next_step": "target_intake",
-                "extracted_data": extracted,
-                "is_complete": False
-            }
-        
-        elif current_step == 'target_intake':
-            if 'fall' in transcript_lower and '2025' in transcript:
-                extracted['target_intake'] = 'fall_2025'
-            elif 'spring' in transcript_lower and '2026' in transcript:
-                extracted['target_intake'] = 'spring_2026'
-            elif 'fall' in transcript_lower and '2026' in transcript:
-                extracted['target_intake'] = 'fall_2026'
-            
-            return {
-                "response_text": "What's your budget per year for tuition? You can give me a range.",
-                "next_step": "budget",
-                "extracted_data": extracted,
-                "is_complete": False
-            }
-        
-        elif current_step == 'budget':
-            import re
-            numbers = re.findall(r'\d+', transcript.replace(',', ''))
-            if len(numbers) >= 2:
-                extracted['budget_min'] = int(numbers[0]) * (1000 if int(numbers[0]) < 100 else 1)
-                extracted['budget_max'] = int(numbers[1]) * (1000 if int(numbers[1]) < 100 else 1)
-            elif len(numbers) == 1:
-                extracted['budget_max'] = int(numbers[0]) * (1000 if int(numbers[0]) < 100 else 1)
-                extracted['budget_min'] = 0
-            
-            return {
-                "response_text": "Last question - have you taken IELTS or TOEFL? If yes, what was your score?",
-                "next_step": "exams",
-                "extracted_data": extracted,
+                "response_text": "I didn't quite catch that. Could you please repeat?",
+                "next_step": current_step,
+                "extracted_data": {},
                 "is_complete": False
             }
         
-        elif current_step == 'exams':
-            if 'not' in transcript_lower or 'no' in transcript_lower:
-                extracted['ielts_status'] = 'not_started'
-            elif 'preparing' in transcript_lower or 'studying' in transcript_lower:
-                extracted['ielts_status'] = 'preparing'
-            else:
-                extracted['ielts_status'] = 'completed'
-                # Try to extract score
-                import re
-                scores = re.findall(r'(\d\.?\d?)', transcript)
-                for score in scores:
-                    if 5 <= float(score) <= 9:
-                        extracted['ielts_score'] = float(score)
-                        break
-            
-            return {
-                "response_text": "Excellent! I now have all the information I need. Your profile is complete! You can now access the AI Counsellor for personalized university recommendations. Would you like to proceed to your dashboard?",
-                "next_step": "complete",
-                "extracted_data": extracted,
-                "is_complete": True
-            }
-        
-        # Default
+        # Simple extraction based on current step
+        extract, response_text, next_step = step
         return {
-            "response_text": "I didn't quite catch that. Could you please repeat?",
-            "next_step": current_step,
-            "extracted_data": {},
-            "is_complete": False
+            "response_text": response_text,
+            "next_step": next_step,
+            "extracted_data": extract(transcript, transcript.lower()),
+            "is_complete": next_step == 'complete'
         }
+
+
+def _extract_education_level(transcript: str, transcript_lower: str) -> dict:
+    if 'bachelor' in transcript_lower:
+        return {'education_level': 'bachelors'}
+    if 'master' in transcript_lower:
+        return {'education_level': 'masters'}
+    if 'high school' in transcript_lower or 'school' in transcript_lower:
+        return {'education_level': 'high_school'}
+    return {}
+
+
+def _extract_major(transcript: str, transcript_lower: str) -> dict:
+    if 'computer' in transcript_lower:
+        return {'major': 'Computer Science'}
+    if 'business' in transcript_lower:
+        return {'major': 'Business Administration'}
+    if 'engineer' in transcript_lower:
+        return {'major': 'Engineering'}
+    return {}
+
+
+def _extract_graduation_year(transcript: str, transcript_lower: str) -> dict:
+    years = _YEAR_RE.findall(transcript)
+    return {'graduation_year': int(years[0])} if years else {}
+
+
+def _extract_intended_degree(transcript: str, transcript_lower: str) -> dict:
+    if 'master' in transcript_lower or 'ms' in transcript_lower:
+        return {'intended_degree': 'masters'}
+    if 'mba' in transcript_lower:
+        return {'intended_degree': 'mba'}
+    if 'phd' in transcript_lower or 'doctor' in transcript_lower:
+        return {'intended_degree': 'phd'}
+    if 'bachelor' in transcript_lower:
+        return {'intended_degree': 'bachelors'}
+    return {}
+
+
+def _extract_field_of_study(transcript: str, transcript_lower: str) -> dict:
+    return {'field_of_study': transcript.strip().title()}
+
+
+def _extract_preferred_countries(transcript: str, transcript_lower: str) -> dict:
+    mentioned = {_COUNTRY_ALIASES[alias] for alias in _COUNTRY_RE.findall(transcript_lower)}
+    countries = [country for country in _COUNTRY_ORDER if country in mentioned]
+    return {'preferred_countries': countries} if countries else {}
+
+
+def _extract_target_intake(transcript: str, transcript_lower: str) -> dict:
+    if 'fall' in transcript_lower and '2025' in transcript:
+        return {'target_intake': 'fall_2025'}
+    if 'spring' in transcript_lower and '2026' in transcript:
+        return {'target_intake': 'spring_2026'}
+    if 'fall' in transcript_lower and '2026' in transcript:
+        return {'target_intake': 'fall_2026'}
+    return {}
+
+
+def _extract_budget(transcript: str, transcript_lower: str) -> dict:
+    # Small numbers are read as thousands ("between 30 and 50")
+    numbers = [int(n) * (1000 if int(n) < 100 else 1) for n in _NUMBER_RE.findall(transcript.replace(',', ''))]
+    if len(numbers) >= 2:
+        return {'budget_min': numbers[0], 'budget_max': numbers[1]}
+    if len(numbers) == 1:
+        return {'budget_max': numbers[0], 'budget_min': 0}
+    return {}
+
+
+def _extract_exams(transcript: str, transcript_lower: str) -> dict:
+    if 'not' in transcript_lower or 'no' in transcript_lower:
+        return {'ielts_status': 'not_started'}
+    if 'preparing' in transcript_lower or 'studying' in transcript_lower:
+        return {'ielts_status': 'preparing'}
+    
+    extracted = {'ielts_status': 'completed'}
+    # Try to extract score
+    for score in _SCORE_RE.findall(transcript):
+        if 5 <= float(score) <= 9:
+            extracted['ielts_score'] = float(score)
+            break
+    return extracted
+
+
+# Voice fallback flow: step -> (extractor, spoken reply, next step)
+_VOICE_FALLBACK_STEPS = {
+    'education_level': (
+        _extract_education_level,
+        "Great! What's your degree and major? For example, Bachelor's in Computer Science.",
+        'degree_major'
+    ),
+    'degree_major': (
+        _extract_major,
+        "Good! What year are you graduating or did you graduate?",
+        'graduation_year'
+    ),
+    'graduation_year': (
+        _extract_graduation_year,
+        "Perfect! What degree are you planning to pursue abroad? Bachelor's, Master's, MBA, or PhD?",
+        'intended_degree'
+    ),
+    'intended_degree': (
+        _extract_intended_degree,
+        "What field would you like to study?",
+        'field_of_study'
+    ),
+    'field_of_study': (
+        _extract_field_of_study,
+        "Which countries are you interested in? You can mention multiple, like USA, Canada, or UK.",
+        'preferred_countries'
+    ),
+    'preferred_countries': (
+        _extract_preferred_countries,
+        "When do you want to start your studies? Fall 2025, Spring 2026, or later?",
+        'target_intake'
+    ),
+    'target_intake': (
+        _extract_target_intake,
+        "What's your budget per year for tuition? You can give me a range.",
+        'budget'
+    ),
+    'budget': (
+        _extract_budget,
+        "Last question - have you taken IELTS or TOEFL? If yes, what was your score?",
+        'exams'
+    ),
+    'exams': (
+        _extract_exams,
+        "Excellent! I now have all the information I need. Your profile is complete! You can now access the AI Counsellor for personalized university recommendations. Would you like to proceed to your dashboard?",
+        'complete'
+    )
+}
+
+def get_gemini(request: Request) -> GeminiService:
+    """Dependency: the app-wide GeminiService created in the lifespan"""
+    return request.app.state.gemini
@@ -0,0 +1,75 @@
+"""
+Storage Service
+S3 object storage for documents using presigned uploads
+"""
+import os
+from typing import Optional
+from uuid import uuid4
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Try to import AWS SDK
+try:
+    import boto3
+    S3_AVAILABLE = True
+except ImportError:
+    print("Warning: boto3 package not found. Documents will be stored on local disk.")
+    S3_AVAILABLE = False
+
+
+MAX_UPLOAD_BYTES = 50 << 20  # 50 MiB
+PRESIGN_EXPIRES_SECONDS = 600
+
+
+class StorageService:
+    def __init__(self):
+        self.bucket = os.getenv("S3_BUCKET")
+        self.client = None
+
+        if S3_AVAILABLE and self.bucket:
+            self.client = boto3.client("s3", region_name=os.getenv("AWS_REGION"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def user_prefix(self, user_id: int) -> str:
+        return f"docs/{user_id}/"
+
+    def presign_upload(self, user_id: int, filename: str, content_type: Optional[str]) -> dict:
+        """Presigned POST so the client uploads straight to S3"""
+        ext = os.path.splitext(os.path.basename(filename or ""))[1].lower()
+        key = f"{self.user_prefix(user_id)}{uuid4().hex}{ext}"
+
+        fields = {"Content-Type": content_type} if content_type else None
+        conditions = [["content-length-range", 0, MAX_UPLOAD_BYTES]]
+        if content_type:
+            conditions.append({"Content-Type": content_type})
+
+        presigned = self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields=fields,
+            Conditions=conditions,
+            ExpiresIn=PRESIGN_EXPIRES_SECONDS
+        )
+        return {"url": presigned["url"], "fields": presigned["fields"], "key": key}
+
+    def head(self, key: str) -> Optional[dict]:
+        """Object metadata, or None if the upload never landed (blocking)"""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.client.exceptions.ClientError:
+            return None
+
+    def delete(self, key: str) -> None:
+        """Delete an object (blocking)"""
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url_for(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+    def key_from_url(self, url: str) -> Optional[str]:
+        prefix = f"s3://{self.bucket}/"
+        return url[len(prefix):] if url.startswith(prefix) else None
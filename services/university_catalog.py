@@ -0,0 +1,81 @@
+"""
+University Catalog
+In-process snapshot of the universities table
+"""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+from pydantic import Field
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import University
+from schemas import UniversityResponse
+
+
+CATALOG_TTL_SECONDS = 300
+
+
+class CatalogUniversity(UniversityResponse):
+    """UniversityResponse plus match keys computed once at load (never serialized)"""
+    country_lc: Optional[str] = Field(default=None, exclude=True)
+
+    def model_post_init(self, __context) -> None:
+        self.country_lc = self.country.lower() if self.country else None
+
+
+class UniversityCatalog:
+    """Immutable university snapshots, reloaded after a University write or the TTL"""
+
+    def __init__(self, ttl_seconds: int = CATALOG_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._universities: Tuple[CatalogUniversity, ...] = ()
+        self._by_id: Dict[int, CatalogUniversity] = {}
+        self._loaded_at: Optional[float] = None
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+        self._generation += 1
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl_seconds
+
+    async def _ensure_loaded(self, db: AsyncSession) -> None:
+        if self._is_fresh():
+            return
+
+        async with self._lock:
+            # Another request may have reloaded while we waited
+            if self._is_fresh():
+                return
+
+            generation = self._generation
+            rows = (await db.execute(select(University).order_by(University.id))).scalars().all()
+            universities = tuple(CatalogUniversity.model_validate(uni) for uni in rows)
+
+            # Swap both views at once so readers never see a mix
+            self._universities, self._by_id = universities, {uni.id: uni for uni in universities}
+            # A write during the load leaves the snapshot stale; reload next time
+            if generation == self._generation:
+                self._loaded_at = time.monotonic()
+
+    async def all(self, db: AsyncSession) -> Tuple[CatalogUniversity, ...]:
+        """Every university, ordered by id"""
+        await self._ensure_loaded(db)
+        return self._universities
+
+    async def get(self, db: AsyncSession, university_id: int) -> Optional[CatalogUniversity]:
+        await self._ensure_loaded(db)
+        return self._by_id.get(university_id)
+
+
+university_catalog = UniversityCatalog()
+
+
+@event.listens_for(University, "after_insert")
+@event.listens_for(University, "after_update")
+@event.listens_for(University, "after_delete")
+def _invalidate_catalog(mapper, connection, target):
+    university_catalog.invalidate()
@@ -0,0 +1,78 @@
+"""
+Gemini Response Cache Tests
+Cached counsellor replies must not leak across different conversation states
+"""
+import unittest
+from types import SimpleNamespace
+
+from services.gemini_service import GeminiService
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = 0
+
+    async def generate_content(self, model, contents, config=None):
+        self.calls += 1
+        return SimpleNamespace(text=f"reply {self.calls}")
+
+
+def make_service() -> GeminiService:
+    service = GeminiService()
+    models = FakeModels()
+    service.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    return service
+
+
+def make_context(history: list, summary=None) -> dict:
+    return {
+        "user_name": "Asha",
+        "current_stage": 2,
+        "profile": {"gpa": 3.8},
+        "shortlisted_universities": [],
+        "locked_universities": [],
+        "pending_tasks": [],
+        "conversation_summary": summary,
+        "conversation_history": history
+    }
+
+
+class ResponseCacheTests(unittest.IsolatedAsyncioTestCase):
+    async def test_same_message_with_different_history_misses_cache(self):
+        service = make_service()
+        first = make_context([
+            {"role": "user", "content": "Should I take the GRE?"},
+            {"role": "assistant", "content": "Yes, most US programs want it."}
+        ])
+        second = make_context([
+            {"role": "user", "content": "Is Canada cheaper than the UK?"},
+            {"role": "assistant", "content": "Usually, yes."}
+        ])
+
+        reply_one = await service.get_counsellor_response("tell me more", first)
+        reply_two = await service.get_counsellor_response("tell me more", second)
+
+        self.assertEqual(service.client.aio.models.calls, 2)
+        self.assertNotEqual(reply_one["message"], reply_two["message"])
+
+    async def test_same_message_with_different_summary_misses_cache(self):
+        service = make_service()
+
+        await service.get_counsellor_response("yes", make_context([], summary="Discussed GRE prep"))
+        await service.get_counsellor_response("yes", make_context([], summary="Discussed visa timelines"))
+
+        self.assertEqual(service.client.aio.models.calls, 2)
+
+    async def test_same_message_and_conversation_hits_cache(self):
+        service = make_service()
+        history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hello!"}]
+
+        reply_one = await service.get_counsellor_response("What next?", make_context(history))
+        reply_two = await service.get_counsellor_response("what next? ", make_context(history))
+
+        self.assertEqual(service.client.aio.models.calls, 1)
+        self.assertEqual(reply_one, reply_two)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+"""
+Profile Value Cleaning Tests
+AI-extracted profile data is coerced to column types before the bulk upsert
+"""
+import unittest
+
+from routers.profile import clean_profile_values
+
+
+class CleanProfileValuesTests(unittest.TestCase):
+    def test_numeric_strings_are_coerced(self):
+        values = clean_profile_values({"gpa": "3.8", "graduation_year": "2025", "budget_max": "50000", "ielts_score": "7.5"})
+
+        self.assertEqual(values, {"gpa": 3.8, "graduation_year": 2025, "budget_max": 50000, "ielts_score": 7.5})
+
+    def test_invalid_fields_are_dropped_without_losing_the_rest(self):
+        values = clean_profile_values({"budget_max": "50,000", "degree": "BSc"})
+
+        self.assertEqual(values, {"degree": "BSc"})
+
+    def test_unknown_and_empty_fields_are_ignored(self):
+        values = clean_profile_values({"user": "x", "id": 7, "sop_status": None, "preferred_countries": "USA, UK"})
+
+        self.assertEqual(values, {"preferred_countries": ["USA", "UK"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+"""
+String List Parsing Tests
+Legacy preferred_countries/programs text must read back as a list, never raise
+"""
+import unittest
+
+from models import StringList, parse_string_list
+
+
+class ParseStringListTests(unittest.TestCase):
+    def test_json_array(self):
+        self.assertEqual(parse_string_list('["USA", "Canada"]'), ["USA", "Canada"])
+
+    def test_comma_separated(self):
+        self.assertEqual(parse_string_list("Canada, Germany, Australia"), ["Canada", "Germany", "Australia"])
+
+    def test_malformed_json_falls_back_to_comma_split(self):
+        self.assertEqual(parse_string_list('["USA", "Canada"'), ["USA", "Canada"])
+        self.assertEqual(parse_string_list("[USA, UK]"), ["USA", "UK"])
+
+    def test_result_processor_does_not_raise_on_malformed_rows(self):
+        self.assertEqual(StringList().process_result_value("[Germany", None), ["Germany"])
+
+
+if __name__ == "__main__":
+    unittest.main()